@@ -27,6 +27,41 @@ def get_db():
         db.close()
 
 
+# Kolumner som lagts till i befintliga tabeller. create_all skapar bara
+# tabeller som saknas, så äldre databaser (även återställda backuper)
+# får kolumnerna tillagda av upgrade_schema.
+_ADDED_COLUMNS = {
+    "companies": {"version_id": "INTEGER NOT NULL DEFAULT 1"},
+    "annual_reports": {"version_id": "INTEGER NOT NULL DEFAULT 1"},
+}
+
+# Index som lagts till efter första versionen (namn -> tabell, kolumn)
+_ADDED_INDEXES = {
+    "ix_transaction_lines_account_id": ("transaction_lines", "account_id"),
+}
+
+
+def upgrade_schema(bind=None):
+    """Lägg till kolumner och index som saknas i en äldre databas"""
+    bind = bind if bind is not None else engine
+    with bind.begin() as connection:
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {
+                row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")
+            }
+            if not existing:
+                continue  # Tabellen finns inte - skapas av create_all
+            for name, ddl in columns.items():
+                if name not in existing:
+                    connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+        for name, (table, column) in _ADDED_INDEXES.items():
+            if connection.exec_driver_sql(f"PRAGMA table_info({table})").first():
+                connection.exec_driver_sql(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})"
+                )
+
+
 def init_db():
-    """Initiera databasen och skapa alla tabeller"""
+    """Initiera databasen, skapa alla tabeller och lägg till nya kolumner och index"""
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
@@ -3,7 +3,7 @@ Företagsmodell - Multi-tenant stöd
 """
 from datetime import date
 from sqlalchemy import Column, Integer, String, Date, Enum, LargeBinary, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from app.models.base import Base
 from app.config import AccountingStandard
 
@@ -39,14 +39,17 @@ class Company(Base):
     phone = Column(String(50))
     website = Column(String(255))
 
-    # Logotyp (lagras som binärdata)
-    logo = Column(LargeBinary, nullable=True)
-    logo_filename = Column(String(255), nullable=True)
-    logo_mimetype = Column(String(100), nullable=True)
+    # Logotyp (lagras som binärdata, laddas först när den används)
+    logo = deferred(Column(LargeBinary, nullable=True), group="logo")
+    logo_filename = deferred(Column(String(255), nullable=True), group="logo")
+    logo_mimetype = deferred(Column(String(100), nullable=True), group="logo")
 
     # Metadata
     created_at = Column(Date, default=date.today)
 
+    # Versionsräknare för optimistisk låsning (höjs vid varje UPDATE)
+    version_id = Column(Integer, nullable=False)
+
     # Relationer
     accounts = relationship("Account", back_populates="company", cascade="all, delete-orphan")
     fiscal_years = relationship("FiscalYear", back_populates="company", cascade="all, delete-orphan")
@@ -56,5 +59,7 @@ class Company(Base):
     annual_reports = relationship("AnnualReport", back_populates="company", cascade="all, delete-orphan")
     shareholdings = relationship("Shareholding", back_populates="company", cascade="all, delete-orphan")
 
+    __mapper_args__ = {"version_id_col": version_id}
+
     def __repr__(self):
         return f"<Company(id={self.id}, name='{self.name}', org={self.org_number})>"
@@ -125,9 +125,14 @@ class AnnualReport(Base):
     created_at = Column(DateTime, default=datetime.now)
     notes = Column(Text, nullable=True)
 
+    # Versionsräknare för optimistisk låsning (höjs vid varje UPDATE)
+    version_id = Column(Integer, nullable=False)
+
     # Relationer
     company = relationship("Company", back_populates="annual_reports")
     fiscal_year = relationship("FiscalYear", backref="annual_report")
 
+    __mapper_args__ = {"version_id_col": version_id}
+
     def __repr__(self):
         return f"<AnnualReport(id={self.id}, year={self.fiscal_year_end.year}, status={self.status})>"
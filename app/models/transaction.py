@@ -70,7 +70,7 @@ class TransactionLine(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=False)
-    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False, index=True)
 
     # Belopp (endast ett av debet/kredit ska vara satt)
     debit = Column(Numeric(15, 2), default=Decimal(0))
@@ -6,8 +6,8 @@ from datetime import date
 from decimal import Decimal
 from pathlib import Path
 from typing import Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import case, func
 
 from app.config import BASE_DIR, AccountType
 from app.models import Company, Account, FiscalYear, Transaction, TransactionLine
@@ -26,6 +26,8 @@ class AccountingService:
 
     def __init__(self, db: Session):
         self.db = db
+        # (företag, kontonummer) -> konto-id för get_account_by_number
+        self._account_ids: dict[tuple[int, str], int] = {}
 
     # === FÖRETAG ===
 
@@ -102,6 +104,7 @@ class AccountingService:
         # Ta bort företaget
         self.db.delete(company)
         self.db.commit()
+        self._account_ids.clear()
 
         return True
 
@@ -147,12 +150,29 @@ class AccountingService:
         )
 
     def get_account_by_number(self, company_id: int, number: str) -> Optional[Account]:
-        """Hämta konto via kontonummer"""
-        return (
+        """
+        Hämta konto via kontonummer
+
+        Konto-id:t sparas per (företag, nummer), så upprepade uppslag går
+        via sessionens identity map i stället för en ny SELECT.
+        """
+        key = (company_id, number)
+        account_id = self._account_ids.get(key)
+        if account_id is not None:
+            account = self.db.get(Account, account_id)
+            if account is not None and account.number == number:
+                return account
+
+        account = (
             self.db.query(Account)
             .filter(Account.company_id == company_id, Account.number == number)
             .first()
         )
+        if account is not None:
+            self._account_ids[key] = account.id
+        else:
+            self._account_ids.pop(key, None)
+        return account
 
     # === RÄKENSKAPSÅR ===
 
@@ -289,11 +309,24 @@ class AccountingService:
         start_date: Optional[date] = None,
         end_date: Optional[date] = None,
         ver_from: Optional[int] = None,
-        ver_to: Optional[int] = None
+        ver_to: Optional[int] = None,
+        eager: bool = False
     ) -> list[Transaction]:
-        """Hämta transaktioner med filter"""
+        """
+        Hämta transaktioner med filter
+
+        Med eager=True laddas konteringsrader, konton och verifikat i förväg
+        (selectinload) så att listor som visar alla rader slipper en fråga
+        per transaktion och konto.
+        """
         query = self.db.query(Transaction).filter(Transaction.company_id == company_id)
 
+        if eager:
+            query = query.options(
+                selectinload(Transaction.lines).selectinload(TransactionLine.account),
+                selectinload(Transaction.vouchers)
+            )
+
         if fiscal_year_id:
             query = query.filter(Transaction.fiscal_year_id == fiscal_year_id)
         if start_date:
@@ -307,6 +340,48 @@ class AccountingService:
 
         return query.order_by(Transaction.verification_number).all()
 
+    def get_ledger_lines(
+        self,
+        company_id: int,
+        fiscal_year_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ) -> list[tuple]:
+        """
+        Hämta huvudbokens konteringsrader som tupler
+
+        Returnerar (account_id, datum, ver.nr, beskrivning, debet, kredit)
+        sorterat på konto, datum och ver.nr direkt i databasen, så att
+        raderna kan grupperas per konto utan sortering i Python.
+        """
+        query = (
+            self.db.query(
+                TransactionLine.account_id,
+                Transaction.transaction_date,
+                Transaction.verification_number,
+                Transaction.description,
+                TransactionLine.debit,
+                TransactionLine.credit
+            )
+            .join(Transaction, TransactionLine.transaction_id == Transaction.id)
+            .filter(Transaction.company_id == company_id)
+        )
+
+        if fiscal_year_id:
+            query = query.filter(Transaction.fiscal_year_id == fiscal_year_id)
+        if start_date:
+            query = query.filter(Transaction.transaction_date >= start_date)
+        if end_date:
+            query = query.filter(Transaction.transaction_date <= end_date)
+
+        return [
+            tuple(row) for row in query.order_by(
+                TransactionLine.account_id,
+                Transaction.transaction_date,
+                Transaction.verification_number
+            )
+        ]
+
     def get_transaction_count(self, company_id: int, fiscal_year_id: int) -> int:
         """Hämta antal transaktioner för ett räkenskapsår"""
         return (
@@ -318,6 +393,27 @@ class AccountingService:
             .scalar() or 0
         )
 
+    def get_verification_range(self, company_id: int, fiscal_year_id: int) -> Optional[tuple[int, int]]:
+        """
+        Hämta lägsta och högsta verifikationsnummer för ett räkenskapsår
+
+        Returnerar None om räkenskapsåret saknar transaktioner.
+        """
+        min_ver, max_ver = (
+            self.db.query(
+                func.min(Transaction.verification_number),
+                func.max(Transaction.verification_number)
+            )
+            .filter(
+                Transaction.company_id == company_id,
+                Transaction.fiscal_year_id == fiscal_year_id
+            )
+            .one()
+        )
+        if min_ver is None:
+            return None
+        return min_ver, max_ver
+
     def get_transaction(self, transaction_id: int) -> Optional[Transaction]:
         """Hämta en specifik transaktion"""
         return self.db.query(Transaction).filter(Transaction.id == transaction_id).first()
@@ -478,6 +574,52 @@ class AccountingService:
         # saldo = IB + debet - kredit
         return ib + total_debit - total_credit
 
+    def get_all_balances(
+        self,
+        company_id: int,
+        fiscal_year_id: Optional[int] = None,
+        end_date: Optional[date] = None
+    ) -> dict[int, Decimal]:
+        """
+        Beräkna saldon för alla konton i ett företag i en enda fråga
+
+        Samma formel som get_account_balance (saldo = IB + debet - kredit),
+        men konteringsraderna summeras med GROUP BY i stället för en
+        fråga per konto.
+
+        Returns:
+            Dict med account_id -> signerat saldo för alla företagets konton
+        """
+        query = (
+            self.db.query(
+                TransactionLine.account_id,
+                func.coalesce(func.sum(TransactionLine.debit), 0),
+                func.coalesce(func.sum(TransactionLine.credit), 0)
+            )
+            .join(Transaction)
+            .filter(Transaction.company_id == company_id)
+        )
+
+        if fiscal_year_id:
+            query = query.filter(Transaction.fiscal_year_id == fiscal_year_id)
+        if end_date:
+            query = query.filter(Transaction.transaction_date <= end_date)
+
+        movements = {
+            account_id: Decimal(str(total_debit)) - Decimal(str(total_credit))
+            for account_id, total_debit, total_credit in query.group_by(TransactionLine.account_id)
+        }
+
+        opening_balances = (
+            self.db.query(Account.id, Account.opening_balance)
+            .filter(Account.company_id == company_id)
+        )
+
+        return {
+            account_id: (ib or Decimal(0)) + movements.get(account_id, Decimal(0))
+            for account_id, ib in opening_balances
+        }
+
     def get_trial_balance(
         self,
         company_id: int,
@@ -497,10 +639,11 @@ class AccountingService:
         Summan av alla balansposter (1xxx + 2xxx) ska bli 0.
         """
         accounts = self.get_accounts(company_id)
+        all_balances = self.get_all_balances(company_id, end_date=end_date)
         balances = []
 
         for account in accounts:
-            balance = self.get_account_balance(account.id, end_date)
+            balance = all_balances[account.id]
             if balance != 0:
                 # Enkel regel: positiv = debet-kolumn, negativ = kredit-kolumn
                 if balance >= 0:
@@ -520,3 +663,51 @@ class AccountingService:
                 })
 
         return balances
+
+    def get_trial_balance_totals(
+        self,
+        company_id: int,
+        end_date: Optional[date] = None
+    ) -> tuple[Decimal, Decimal]:
+        """
+        Summera råbalansens debet- och kreditkolumn direkt i databasen
+
+        Samma saldon som get_trial_balance (IB + debet - kredit per konto),
+        men bara kolumnsummorna hämtas - inga rader per konto.
+
+        Returns:
+            (summa debet, summa kredit)
+        """
+        movements = (
+            self.db.query(
+                TransactionLine.account_id.label("account_id"),
+                func.sum(TransactionLine.debit - TransactionLine.credit).label("movement")
+            )
+            .join(Transaction)
+            .filter(Transaction.company_id == company_id)
+        )
+        if end_date:
+            movements = movements.filter(Transaction.transaction_date <= end_date)
+        movements = movements.group_by(TransactionLine.account_id).subquery()
+
+        balance = (
+            func.coalesce(Account.opening_balance, 0)
+            + func.coalesce(movements.c.movement, 0)
+        )
+        total_debit, total_credit = (
+            self.db.query(
+                func.coalesce(func.sum(case((balance > 0, balance), else_=0)), 0),
+                func.coalesce(func.sum(case((balance < 0, -balance), else_=0)), 0)
+            )
+            .select_from(Account)
+            .outerjoin(movements, movements.c.account_id == Account.id)
+            .filter(Account.company_id == company_id)
+            .one()
+        )
+
+        # SQLite summerar som flyttal - avrunda tillbaka till ören
+        cent = Decimal("0.01")
+        return (
+            Decimal(str(total_debit)).quantize(cent),
+            Decimal(str(total_credit)).quantize(cent)
+        )
@@ -8,9 +8,10 @@ Hanterar:
 """
 from datetime import date, datetime
 from decimal import Decimal
+from itertools import islice
 from typing import List, Optional, Dict
 from dateutil.relativedelta import relativedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 from app.models import Account, Transaction, FiscalYear
 from app.models.accrual import Accrual, AccrualEntry, AccrualType, AccrualFrequency
@@ -120,8 +121,17 @@ class AccrualService:
         company_id: int,
         active_only: bool = True
     ) -> List[Accrual]:
-        """Hämta periodiseringar för ett företag"""
-        query = self.db.query(Accrual).filter(Accrual.company_id == company_id)
+        """
+        Hämta periodiseringar för ett företag
+
+        Periodiseringsposterna laddas i förväg (selectinload) eftersom både
+        listningen och remaining_amount/periods_remaining läser dem.
+        """
+        query = (
+            self.db.query(Accrual)
+            .options(selectinload(Accrual.entries))
+            .filter(Accrual.company_id == company_id)
+        )
         if active_only:
             query = query.filter(Accrual.is_active == True)
         return query.order_by(Accrual.start_date.desc()).all()
@@ -314,49 +324,23 @@ class AccrualService:
             return True
         return False
 
-    def get_pending_entries(
-        self,
-        company_id: int,
-        up_to_date: date = None
-    ) -> List[Dict]:
+    def _iter_pending(self, company_id: int, up_to_date: date):
         """
-        Förhandsgranska väntande periodiseringar utan att skapa dem
+        Generera (periodisering, periodnummer, periodens datum) för väntande perioder
 
-        Returns:
-            Lista med info om väntande periodiseringar
+        Befintliga poster läses från de förladdade entries (se get_accruals)
+        i stället för en fråga per period.
         """
-        if up_to_date is None:
-            up_to_date = date.today()
-
-        accruals = self.get_accruals(company_id, active_only=True)
-        pending = []
-
-        for accrual in accruals:
+        for accrual in self.get_accruals(company_id, active_only=True):
+            booked = {entry.period_number for entry in accrual.entries}
             current_date = accrual.start_date
 
             for period_num in range(1, accrual.periods + 1):
                 if current_date > up_to_date:
                     break
 
-                # Kontrollera om entry redan finns
-                existing = (
-                    self.db.query(AccrualEntry)
-                    .filter(
-                        AccrualEntry.accrual_id == accrual.id,
-                        AccrualEntry.period_number == period_num
-                    )
-                    .first()
-                )
-
-                if not existing:
-                    pending.append({
-                        'accrual_id': accrual.id,
-                        'accrual_name': accrual.name,
-                        'period_number': period_num,
-                        'period_date': current_date,
-                        'amount': float(accrual.amount_per_period),
-                        'type': accrual.accrual_type.value
-                    })
+                if period_num not in booked:
+                    yield accrual, period_num, current_date
 
                 # Nästa period
                 if accrual.frequency == AccrualFrequency.MONTHLY:
@@ -366,4 +350,41 @@ class AccrualService:
                 else:
                     current_date = current_date + relativedelta(years=1)
 
-        return pending
+    def get_pending_entries(
+        self,
+        company_id: int,
+        up_to_date: date = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Förhandsgranska väntande periodiseringar utan att skapa dem
+
+        Args:
+            limit: Max antal poster (genomgången avbryts när gränsen nås)
+
+        Returns:
+            Lista med info om väntande periodiseringar
+        """
+        if up_to_date is None:
+            up_to_date = date.today()
+
+        return [
+            {
+                'accrual_id': accrual.id,
+                'accrual_name': accrual.name,
+                'period_number': period_num,
+                'period_date': period_date,
+                'amount': float(accrual.amount_per_period),
+                'type': accrual.accrual_type.value
+            }
+            for accrual, period_num, period_date in islice(
+                self._iter_pending(company_id, up_to_date), limit
+            )
+        ]
+
+    def get_pending_count(self, company_id: int, up_to_date: date = None) -> int:
+        """Räkna väntande periodiseringar utan att bygga upp förhandsgranskningen"""
+        if up_to_date is None:
+            up_to_date = date.today()
+
+        return sum(1 for _ in self._iter_pending(company_id, up_to_date))
@@ -121,10 +121,9 @@ class ClosingService:
 
     def _check_trial_balance(self, company_id: int, as_of_date: date) -> str:
         """Kontrollera att råbalansen balanserar"""
-        balances = self.accounting_service.get_trial_balance(company_id, as_of_date)
-
-        total_debit = sum(Decimal(str(b['debit'])) for b in balances)
-        total_credit = sum(Decimal(str(b['credit'])) for b in balances)
+        total_debit, total_credit = self.accounting_service.get_trial_balance_totals(
+            company_id, as_of_date
+        )
 
         if abs(total_debit - total_credit) < Decimal('0.01'):
             return 'passed'
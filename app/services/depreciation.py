@@ -8,7 +8,8 @@ Stödjer:
 """
 from datetime import date
 from decimal import Decimal
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.models import (
@@ -18,6 +19,20 @@ from app.models import (
 from app.services.accounting import AccountingService
 
 
+class AssetSummary(NamedTuple):
+    """Lättviktig rad för tillgångslistan (utan ORM-objekt)"""
+    asset_id: int
+    name: str
+    asset_type: AssetType
+    is_active: bool
+    acquisition_date: date
+    acquisition_cost: Decimal
+    residual_value: Decimal
+    useful_life_months: int
+    depreciation_method: DepreciationMethod
+    annual_depreciation: Decimal
+
+
 class DepreciationService:
     """
     Tjänst för avskrivningsberäkning och bokföring
@@ -125,6 +140,78 @@ class DepreciationService:
             query = query.filter(Asset.is_active == True)
         return query.order_by(Asset.acquisition_date.desc()).all()
 
+    def get_assets_summary(self, company_id: int, active_only: bool = False) -> List[AssetSummary]:
+        """
+        Hämta tillgångar för listvyn med endast de kolumner som visas
+
+        Årlig avskrivning beräknas som Asset.annual_depreciation men från
+        kolumnvärdena, så att inga ORM-objekt behöver byggas.
+        """
+        query = self.db.query(
+            Asset.id, Asset.name, Asset.asset_type, Asset.is_active,
+            Asset.acquisition_date, Asset.acquisition_cost, Asset.residual_value,
+            Asset.useful_life_months, Asset.depreciation_method
+        ).filter(Asset.company_id == company_id)
+        if active_only:
+            query = query.filter(Asset.is_active == True)
+
+        result = []
+        for row in query.order_by(Asset.acquisition_date.desc()):
+            residual = Decimal(str(row.residual_value or 0))
+            depreciable = Decimal(str(row.acquisition_cost)) - residual
+            annual = (
+                depreciable / row.useful_life_months * 12
+                if row.useful_life_months and row.useful_life_months > 0
+                else Decimal(0)
+            )
+            result.append(AssetSummary(
+                asset_id=row.id,
+                name=row.name,
+                asset_type=row.asset_type,
+                is_active=row.is_active,
+                acquisition_date=row.acquisition_date,
+                acquisition_cost=row.acquisition_cost,
+                residual_value=residual,
+                useful_life_months=row.useful_life_months,
+                depreciation_method=row.depreciation_method,
+                annual_depreciation=annual,
+            ))
+        return result
+
+    def get_book_values_bulk(
+        self,
+        company_id: int,
+        as_of_date: date
+    ) -> dict[int, tuple[Decimal, Decimal]]:
+        """
+        Hämta ackumulerad avskrivning och bokfört värde för alla tillgångar
+
+        Summerar avskrivningsposterna t.o.m. datum i en grupperad fråga i
+        stället för get_accumulated_depreciation/get_book_value per tillgång.
+
+        Returns:
+            {asset_id: (ackumulerad avskrivning, bokfört värde)}
+        """
+        accumulated = dict(
+            self.db.query(AssetDepreciation.asset_id, func.sum(AssetDepreciation.amount))
+            .join(Asset, AssetDepreciation.asset_id == Asset.id)
+            .filter(
+                Asset.company_id == company_id,
+                AssetDepreciation.depreciation_date <= as_of_date
+            )
+            .group_by(AssetDepreciation.asset_id)
+            .all()
+        )
+
+        result = {}
+        for asset_id, acquisition_cost in (
+            self.db.query(Asset.id, Asset.acquisition_cost)
+            .filter(Asset.company_id == company_id)
+        ):
+            acc = Decimal(str(accumulated.get(asset_id) or 0))
+            result[asset_id] = (acc, Decimal(str(acquisition_cost)) - acc)
+        return result
+
     def get_asset(self, asset_id: int) -> Optional[Asset]:
         """Hämta en specifik tillgång"""
         return self.db.query(Asset).filter(Asset.id == asset_id).first()
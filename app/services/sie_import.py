@@ -10,15 +10,31 @@ Stödjer:
 """
 import re
 from datetime import date
+from functools import lru_cache
 from decimal import Decimal, InvalidOperation
-from typing import Optional
+from typing import Optional, Union
 from dataclasses import dataclass, field
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from app.models import Company, Account, FiscalYear, Transaction, TransactionLine
 from app.config import AccountType
 
 
+_ZERO = Decimal(0)
+
+
+@lru_cache(maxsize=8192)
+def _decimal(amount: str) -> Decimal:
+    """
+    Tolka ett belopp från SIE-filen (cachat)
+
+    Samma belopp återkommer ofta (momsrader, runda summor) och Decimal
+    är oföränderlig, så instanserna kan delas.
+    """
+    return Decimal(amount)
+
+
 @dataclass
 class SIEAccount:
     """Konto från SIE-fil"""
@@ -60,13 +76,32 @@ class SIEParser:
     - #VER - Verifikationer med transaktioner
     """
 
+    # Mönstren kompileras en gång för klassen och delas av alla instanser
+    _QUOTED_RE = re.compile(r'"([^"]*)"')
+    _DATE_RE = re.compile(r'\b(20\d{6})\b')
+    _ORGNR_RE = re.compile(r'#ORGNR\s+"?([0-9-]+)"?')
+    _KONTO_RE = re.compile(r'#KONTO\s+(\d+)\s+"([^"]*)"')
+    _IB_RE = re.compile(r'#IB\s+(-?\d+)\s+(\d+)\s+(-?[\d.,]+)')
+    _VER_NUMBER_RE = re.compile(r'#VER\s+\S+\s+(\d+)')
+    _ACCOUNT_NUMBER_RE = re.compile(r'(\d+)')
+    _TRANS_AMOUNT_RE = re.compile(r'\{[^}]*\}\s*(-?[\d\s]+[.,]?\d*)')
+    _TRANS_AMOUNT_NO_DIM_RE = re.compile(r'^\d+\s+(-?[\d\s]+[.,]?\d*)')
+
     def __init__(self):
         self.data = SIEData()
 
-    def parse(self, content: str) -> SIEData:
-        """Parsa SIE-filinnehåll"""
+    def parse(self, content: Union[str, bytes]) -> SIEData:
+        """
+        Parsa SIE-filinnehåll
+
+        Råa filbytes avkodas som PC8 (cp437), vilket är SIE-standardens
+        teckenkodning.
+        """
         self.data = SIEData()
 
+        if isinstance(content, bytes):
+            content = content.decode('cp437', errors='replace')
+
         # Normalisera radbrytningar (hantera både \r\n och \n)
         content = content.replace('\r\n', '\n').replace('\r', '\n')
         lines = content.split('\n')
@@ -74,42 +109,48 @@ class SIEParser:
         current_verification = None
         in_verification_block = False
 
+        # Taggar utan verifikationstillstånd slås upp direkt i stället för
+        # att prövas en i taget med startswith
+        tag_handlers = {
+            '#FNAMN': self._parse_company_name,
+            '#ORGNR': self._parse_org_number,
+            '#RAR': self._parse_fiscal_year,
+            '#KONTO': self._parse_account,
+            '#IB': self._parse_opening_balance,
+        }
+        transactions = self.data.transactions
+
         for line in lines:
             line = line.strip()
-            if not line or line.startswith('//'):
+            if not line:
                 continue
+            first = line[0]
+
+            if first == '#':
+                tag = line.split(None, 1)[0]
+                if tag == '#TRANS':
+                    if current_verification:
+                        self._parse_transaction_line(line, current_verification)
+                elif tag == '#VER':
+                    current_verification = self._parse_verification(line)
+                    # Kolla om { är på samma rad
+                    if '{' in line:
+                        in_verification_block = True
+                else:
+                    handler = tag_handlers.get(tag)
+                    if handler:
+                        handler(line)
 
             # Kolla om raden börjar med { (start av verifikationsblock)
-            if line == '{':
+            elif line == '{':
                 in_verification_block = True
-                continue
 
             # Kolla om raden är } (slut på verifikationsblock)
-            if line == '}' or line.startswith('}'):
+            elif first == '}':
                 if current_verification and current_verification.lines:
-                    self.data.transactions.append(current_verification)
+                    transactions.append(current_verification)
                 current_verification = None
                 in_verification_block = False
-                continue
-
-            # Identifiera taggar
-            if line.startswith('#FNAMN'):
-                self._parse_company_name(line)
-            elif line.startswith('#ORGNR'):
-                self._parse_org_number(line)
-            elif line.startswith('#RAR'):
-                self._parse_fiscal_year(line)
-            elif line.startswith('#KONTO'):
-                self._parse_account(line)
-            elif line.startswith('#IB'):
-                self._parse_opening_balance(line)
-            elif line.startswith('#VER'):
-                current_verification = self._parse_verification(line)
-                # Kolla om { är på samma rad
-                if '{' in line:
-                    in_verification_block = True
-            elif line.startswith('#TRANS') and current_verification:
-                self._parse_transaction_line(line, current_verification)
 
         # Hantera fall där filen slutar utan avslutande }
         if current_verification and current_verification.lines:
@@ -119,21 +160,21 @@ class SIEParser:
 
     def _parse_company_name(self, line: str):
         """Parsa #FNAMN "Företagsnamn"""
-        match = re.search(r'"([^"]*)"', line)
+        match = self._QUOTED_RE.search(line)
         if match:
             self.data.company_name = match.group(1)
 
     def _parse_org_number(self, line: str):
         """Parsa #ORGNR orgnummer"""
         # Format kan vara: #ORGNR 556123-4567 eller #ORGNR "556123-4567"
-        match = re.search(r'#ORGNR\s+"?([0-9-]+)"?', line)
+        match = self._ORGNR_RE.search(line)
         if match:
             self.data.org_number = match.group(1)
 
     def _parse_fiscal_year(self, line: str):
         """Parsa #RAR 0 20240101 20241231"""
         # Hitta alla datum i formatet YYYYMMDD
-        dates = re.findall(r'\b(20\d{6})\b', line)
+        dates = self._DATE_RE.findall(line)
         if len(dates) >= 2:
             try:
                 start_str = dates[0]
@@ -150,7 +191,7 @@ class SIEParser:
     def _parse_account(self, line: str):
         """Parsa #KONTO 1930 "Företagskonto\""""
         # Format: #KONTO kontonummer "kontonamn"
-        match = re.match(r'#KONTO\s+(\d+)\s+"([^"]*)"', line)
+        match = self._KONTO_RE.match(line)
         if match:
             self.data.accounts.append(SIEAccount(
                 number=match.group(1),
@@ -160,12 +201,13 @@ class SIEParser:
     def _parse_opening_balance(self, line: str):
         """Parsa #IB 0 1930 50000.00 eller #IB 0 1930 -50000.00"""
         # Format: #IB årsnr kontonummer belopp
-        match = re.match(r'#IB\s+(-?\d+)\s+(\d+)\s+(-?[\d.,]+)', line)
-        if match:
+        # Årsnr 0 är innevarande år, -1 föregående år osv. - bara 0 importeras
+        match = self._IB_RE.match(line)
+        if match and int(match.group(1)) == 0:
             try:
                 account_number = match.group(2)
                 balance_str = match.group(3).replace(',', '.').replace(' ', '')
-                balance = Decimal(balance_str)
+                balance = _decimal(balance_str)
                 self.data.opening_balances[account_number] = balance
             except (InvalidOperation, ValueError):
                 pass
@@ -187,12 +229,12 @@ class SIEParser:
         description = "Importerad"
 
         # Hitta verifikationsnummer (siffror efter serie)
-        ver_match = re.search(r'#VER\s+\S+\s+(\d+)', line)
+        ver_match = self._VER_NUMBER_RE.search(line)
         if ver_match:
             ver_number = int(ver_match.group(1))
 
         # Hitta datum (YYYYMMDD)
-        date_match = re.search(r'\b(20\d{6})\b', line)
+        date_match = self._DATE_RE.search(line)
         if date_match:
             try:
                 date_str = date_match.group(1)
@@ -203,7 +245,7 @@ class SIEParser:
                 pass
 
         # Hitta beskrivning (text inom citattecken)
-        desc_match = re.search(r'"([^"]*)"', line)
+        desc_match = self._QUOTED_RE.search(line)
         if desc_match:
             description = desc_match.group(1) or "Importerad"
 
@@ -233,7 +275,7 @@ class SIEParser:
         line = line.replace('#TRANS', '').strip()
 
         # Extrahera kontonummer (första nummersekvensen)
-        account_match = re.match(r'(\d+)', line)
+        account_match = self._ACCOUNT_NUMBER_RE.match(line)
         if not account_match:
             return
 
@@ -241,18 +283,18 @@ class SIEParser:
 
         # Hitta belopp - leta efter tal efter {} eller tom {}
         # Mönster: {} följt av ett tal (möjligen negativt, med . eller , som decimal)
-        amount_match = re.search(r'\{[^}]*\}\s*(-?[\d\s]+[.,]?\d*)', line)
+        amount_match = self._TRANS_AMOUNT_RE.search(line)
 
         if not amount_match:
             # Alternativt format utan {}: kontonummer följt av belopp
-            amount_match = re.search(r'^\d+\s+(-?[\d\s]+[.,]?\d*)', line)
+            amount_match = self._TRANS_AMOUNT_NO_DIM_RE.search(line)
 
         if amount_match:
             try:
                 amount_str = amount_match.group(1)
                 # Rensa och normalisera
                 amount_str = amount_str.replace(' ', '').replace(',', '.')
-                amount = Decimal(amount_str)
+                amount = _decimal(amount_str)
 
                 # I SIE-format: positiv = debet, negativ = kredit
                 # Vi sparar alltid positiva värden i rätt kolumn
@@ -260,13 +302,13 @@ class SIEParser:
                     verification.lines.append({
                         'account_number': account_number,
                         'debit': amount,
-                        'credit': Decimal(0)
+                        'credit': _ZERO
                     })
                 else:
                     verification.lines.append({
                         'account_number': account_number,
-                        'debit': Decimal(0),
-                        'credit': abs(amount)
+                        'debit': _ZERO,
+                        'credit': -amount
                     })
             except (InvalidOperation, ValueError):
                 pass
@@ -281,12 +323,12 @@ class SIEImporter:
         self.db = db
         self.parser = SIEParser()
 
-    def import_file(self, content: str, company_id: Optional[int] = None) -> dict:
+    def import_file(self, content: Union[str, bytes], company_id: Optional[int] = None) -> dict:
         """
         Importera SIE-fil
 
         Args:
-            content: SIE-filinnehåll
+            content: SIE-filinnehåll, som text eller råa filbytes
             company_id: Befintligt företags-ID (om None skapas nytt)
 
         Returns:
@@ -344,31 +386,38 @@ class SIEImporter:
         self.db.refresh(company)
         return company
 
+    def _account_ids(self, company_id: int) -> dict[str, int]:
+        """Hämta företagets konton som kontonummer -> id i en fråga"""
+        return dict(
+            self.db.query(Account.number, Account.id)
+            .filter(Account.company_id == company_id)
+        )
+
     def _import_accounts(self, company_id: int, accounts: list[SIEAccount]) -> int:
-        """Importera konton"""
-        count = 0
-        for acc in accounts:
-            # Kontrollera om kontot redan finns
-            existing = self.db.query(Account).filter(
-                Account.company_id == company_id,
-                Account.number == acc.number
-            ).first()
+        """
+        Importera konton
 
-            if not existing:
+        Konton som redan finns hoppas över. De nya infogas med en
+        executemany i stället för en INSERT per konto.
+        """
+        existing = set(self._account_ids(company_id))
+        rows = []
+        for acc in accounts:
+            if acc.number in existing:
+                continue
+            existing.add(acc.number)
+            rows.append({
+                'company_id': company_id,
+                'number': acc.number,
+                'name': acc.name,
                 # Bestäm kontotyp baserat på kontonummer
-                account_type = self._determine_account_type(acc.number)
-
-                account = Account(
-                    company_id=company_id,
-                    number=acc.number,
-                    name=acc.name,
-                    account_type=account_type
-                )
-                self.db.add(account)
-                count += 1
+                'account_type': self._determine_account_type(acc.number)
+            })
 
+        if rows:
+            self.db.execute(insert(Account), rows)
         self.db.commit()
-        return count
+        return len(rows)
 
     def _determine_account_type(self, number: str) -> AccountType:
         """Bestäm kontotyp baserat på BAS-kontonummer"""
@@ -430,11 +479,13 @@ class SIEImporter:
         Vi lagrar värdet direkt från SIE-filen. Teckenhantering sker vid visning
         i rapporter för att säkerställa att balansräkningen stämmer.
         """
+        accounts = {
+            account.number: account
+            for account in self.db.query(Account).filter(Account.company_id == company_id)
+        }
+
         for account_number, balance in balances.items():
-            account = self.db.query(Account).filter(
-                Account.company_id == company_id,
-                Account.number == account_number
-            ).first()
+            account = accounts.get(account_number)
 
             # Skapa konto om det saknas
             if not account:
@@ -454,63 +505,61 @@ class SIEImporter:
         fiscal_year_id: int,
         transactions: list[SIETransaction]
     ) -> int:
-        """Importera transaktioner"""
-        count = 0
+        """
+        Importera transaktioner
 
-        for tx_data in transactions:
-            try:
-                # Kontrollera att transaktionen har rader
-                if not tx_data.lines:
-                    continue
-
-                # Skapa transaktion
-                transaction = Transaction(
-                    company_id=company_id,
-                    fiscal_year_id=fiscal_year_id,
-                    verification_number=tx_data.verification_number,
-                    transaction_date=tx_data.date,
-                    description=tx_data.description
-                )
-                self.db.add(transaction)
-                self.db.flush()
-
-                # Skapa transaktionsrader
-                lines_added = 0
-                for line_data in tx_data.lines:
-                    account = self.db.query(Account).filter(
-                        Account.company_id == company_id,
-                        Account.number == line_data['account_number']
-                    ).first()
-
-                    # Skapa konto om det saknas
-                    if not account:
-                        account = self._create_missing_account(
-                            company_id,
-                            line_data['account_number']
-                        )
-
-                    if account:
-                        line = TransactionLine(
-                            transaction_id=transaction.id,
-                            account_id=account.id,
-                            debit=line_data['debit'],
-                            credit=line_data['credit']
-                        )
-                        self.db.add(line)
-                        lines_added += 1
-
-                if lines_added > 0:
-                    count += 1
-                else:
-                    # Ta bort transaktionen om inga rader kunde läggas till
-                    self.db.delete(transaction)
+        Verifikationerna infogas i en executemany med RETURNING för att få
+        deras id:n, därefter alla konteringsrader i en andra executemany.
+        Kontona slås upp i en förhämtad mappning i stället för en fråga
+        per rad.
+        """
+        account_ids = self._account_ids(company_id)
+        tx_rows = []
+        tx_lines = []
 
-            except Exception:
-                # Hoppa över felaktiga transaktioner
+        for tx_data in transactions:
+            # Kontrollera att transaktionen har rader
+            if not tx_data.lines:
                 continue
 
+            lines = []
+            for line_data in tx_data.lines:
+                account_number = line_data['account_number']
+                account_id = account_ids.get(account_number)
+
+                # Skapa konto om det saknas
+                if account_id is None:
+                    account = self._create_missing_account(company_id, account_number)
+                    account_id = account_ids[account_number] = account.id
+
+                lines.append({
+                    'account_id': account_id,
+                    'debit': line_data['debit'],
+                    'credit': line_data['credit']
+                })
+
+            tx_rows.append({
+                'company_id': company_id,
+                'fiscal_year_id': fiscal_year_id,
+                'verification_number': tx_data.verification_number,
+                'transaction_date': tx_data.date,
+                'description': tx_data.description
+            })
+            tx_lines.append(lines)
+
+        if tx_rows:
+            tx_ids = self.db.scalars(
+                insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+                tx_rows
+            ).all()
+            self.db.execute(insert(TransactionLine), [
+                {**line, 'transaction_id': tx_id}
+                for tx_id, lines in zip(tx_ids, tx_lines)
+                for line in lines
+            ])
+
         self.db.commit()
-        return count
+        return len(tx_rows)
 
     def _create_missing_account(self, company_id: int, account_number: str) -> Optional[Account]:
         """Skapa saknat konto med standardnamn baserat på BAS-kontoplan"""
@@ -7,6 +7,7 @@ Två typer av mallar:
 """
 from datetime import date, datetime
 from decimal import Decimal
+from operator import attrgetter
 from typing import List, Optional, Dict
 from pathlib import Path
 from sqlalchemy.orm import Session
@@ -134,7 +135,7 @@ class TemplateService:
         remainder_line = None
 
         # Sortera rader
-        sorted_lines = sorted(template.lines, key=lambda x: x.sort_order)
+        sorted_lines = sorted(template.lines, key=attrgetter('sort_order'))
 
         for line in sorted_lines:
             if line.is_remainder:
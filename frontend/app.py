@@ -2,20 +2,44 @@
 Bokföringssystem - Streamlit Huvudapp
 """
 import streamlit as st
+import math
+import tempfile
+import zipfile
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from functools import partial, wraps
+from operator import attrgetter
 from pathlib import Path
 import sys
 
+from sqlalchemy import func
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.exc import StaleDataError
+from streamlit.errors import StreamlitAPIException
+
 # Lägg till projektrot i path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.models.base import engine, Base, SessionLocal
+from app.models.base import engine, Base, SessionLocal, upgrade_schema
 from app.services.accounting import AccountingService
-from app.services.sie_import import SIEImporter
+from app.services.sie_import import SIEImporter, SIEParser, SIEData
 from app.services.document_processor import DocumentProcessor, suggest_accounts
 from app.services.report_generator import ReportGenerator
+from app.services.tax import VATReport, EmployerReport
+from app.services.tax_declaration import TaxDeclarationService
+from app.services.depreciation import DepreciationService
+from app.services.closing import ClosingService
+from app.services.backup import BackupService, BackupConfig
+from app.models import (
+    FiscalYear, AssetType, DepreciationMethod,
+    Shareholding, ShareholdingType, ShareholdingTransaction,
+    DocumentType, Company, CompanyDocument, AnnualReport
+)
 
-# Skapa databastabeller
+# Skapa databastabeller och lägg till kolumner som saknas i äldre databaser
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 st.set_page_config(
     page_title="Bokföring",
@@ -29,6 +53,78 @@ if "selected_company_id" not in st.session_state:
     st.session_state.selected_company_id = None
 
 
+# Kontoklasser i BAS-kontoplanen
+_CLASS_NAMES = {
+    1: "Tillgångar",
+    2: "Eget kapital och skulder",
+    3: "Intäkter",
+    4: "Kostnader för varor",
+    5: "Övriga externa kostnader",
+    6: "Övriga externa kostnader",
+    7: "Personalkostnader",
+    8: "Finansiella poster"
+}
+
+# Kontogrupper för huvudbokens filter
+_ACCOUNT_GROUPS = {
+    "Alla konton": None,
+    "1xxx - Tillgångar": "1",
+    "2xxx - Eget kapital och skulder": "2",
+    "3xxx - Intäkter": "3",
+    "4xxx - Kostnader varor": "4",
+    "5xxx - Övriga externa kostnader": "5",
+    "6xxx - Övriga externa kostnader": "6",
+    "7xxx - Personal": "7",
+    "8xxx - Finansiella poster": "8"
+}
+
+# Beloppsformatering för tabellceller (tusentalsavgränsare, två decimaler)
+_MONEY = "{:,.2f}".format
+
+# Momssatser i valordning, öresavrundning och momsandel av ett belopp
+# inklusive moms, per momssats
+_VAT_RATES = (25, 12, 6, 0)
+_VAT_RATE_INDEX = {rate: i for i, rate in enumerate(_VAT_RATES)}
+_CENT = Decimal("0.01")
+_VAT_FACTOR = {rate: Decimal(rate) / Decimal(100 + rate) for rate in _VAT_RATES}
+# Ingående moms enligt BAS, samma konto som momsrapporten läser
+_INPUT_VAT_ACCOUNT = VATReport.VAT_ACCOUNTS['input']
+
+# Mappa rapporttyp till intern nyckel
+_REPORT_TYPE_MAP = {
+    "Balansräkning": "balance_sheet",
+    "Resultaträkning": "income_statement",
+    "Råbalans": "trial_balance",
+    "Huvudbok": "general_ledger",
+    "Årsredovisning": "annual_report",
+}
+
+# Valbara typer i tillgångs- och aktieformulären (etikett -> enum)
+_ASSET_TYPE_MAP = {t.value: t for t in AssetType}
+_ASSET_TYPE_VALUES = list(_ASSET_TYPE_MAP)
+_DEPRECIATION_METHOD_MAP = {m.value: m for m in DepreciationMethod}
+_DEPRECIATION_METHOD_VALUES = list(_DEPRECIATION_METHOD_MAP)
+_SHAREHOLDING_TYPES = list(ShareholdingType)
+
+# Dokumenttyper och statusar för årsredovisningar i inställningarna
+_DOC_TYPES = tuple(DocumentType)
+_REPORT_STATUSES = ('draft', 'submitted', 'registered', 'rejected')
+_REPORT_STATUS_INDEX = {status: i for i, status in enumerate(_REPORT_STATUSES)}
+_REPORT_STATUS_ICONS = {
+    'draft': '📝',
+    'submitted': '📤',
+    'registered': '✅',
+    'rejected': '❌'
+}
+_AUDITOR_OPINIONS = {
+    None: "Ej granskat",
+    'clean': 'Ren revisionsberättelse',
+    'qualified': 'Med anmärkning',
+    'adverse': 'Avvikande mening',
+    'disclaimer': 'Avstår uttalande'
+}
+
+
 def get_db():
     """Hämta databassession"""
     db = SessionLocal()
@@ -38,17 +134,149 @@ def get_db():
         pass  # Stängs manuellt
 
 
+def _bucket_by_class(accounts) -> dict:
+    """Gruppera konton per kontoklass (första siffran i kontonumret) i ett svep"""
+    buckets = defaultdict(list)
+    for acc in accounts:
+        buckets[acc.number[:1]].append(acc)
+    return buckets
+
+
+def _amount_frame(rows):
+    """Bygg en tabell (DataFrame) av (post, belopp)-rader"""
+    import pandas as pd
+
+    return pd.DataFrame(rows, columns=["Post", "Belopp"]).set_index("Post")
+
+
+def _amount_table(rows, fmt: str = "{:,.2f} kr"):
+    """Visa (post, belopp)-rader, eller en färdig _amount_frame, som en tabell"""
+    df = rows if hasattr(rows, "style") else _amount_frame(rows)
+    st.table(df.style.format(fmt))
+
+
+def _upload_bytes(uploaded_file, slot: str) -> bytes:
+    """
+    Läs en uppladdad fil en gång och återanvänd innehållet vid reruns
+
+    Innehållet sparas i session_state under slot och läses om först när
+    file_id ändras (dvs. en ny fil laddats upp).
+    """
+    key = f"_upload_{slot}"
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != uploaded_file.file_id:
+        cached = st.session_state[key] = (uploaded_file.file_id, uploaded_file.getvalue())
+    return cached[1]
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_fiscal_years(company_id: int) -> list[tuple]:
+    """
+    Hämta räkenskapsår som rena tupler (id, start, slut, stängt)
+
+    ORM-objekt cachas inte - tuplerna kan delas mellan reruns och sessioner.
+    """
+    db = SessionLocal()
+    try:
+        return [
+            (fy.id, fy.start_date, fy.end_date, fy.is_closed)
+            for fy in AccountingService(db).get_fiscal_years(company_id)
+        ]
+    finally:
+        db.close()
+
+
+def _fiscal_years(service: AccountingService, company_id: int) -> list:
+    """
+    Hämta räkenskapsår för ett företag från cachen
+
+    Returnerar fristående FiscalYear-objekt byggda från de cachade tuplerna;
+    endast kolumnvärdena (id, datum, is_closed) används av vyerna.
+    Cachen töms med _invalidate_fiscal_years när räkenskapsår ändras.
+    """
+    return [
+        FiscalYear(id=fy_id, company_id=company_id, start_date=start, end_date=end, is_closed=closed)
+        for fy_id, start, end, closed in _cached_fiscal_years(company_id)
+    ]
+
+
+def _invalidate_fiscal_years(company_id: int = None):
+    """Töm cachade räkenskapsår för ett företag (eller alla om inget anges)"""
+    if company_id is None:
+        _cached_fiscal_years.clear()
+    else:
+        _cached_fiscal_years.clear(company_id)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _account_options(company_id: int) -> tuple[list[str], dict[str, str]]:
+    """
+    Hämta kontoval för formulär ("nummer - namn") från cachen
+
+    Returnerar etiketterna i kontoplanens ordning samt en mappning från
+    etikett till kontonummer. Cachen töms när konton skapas.
+    """
+    db = SessionLocal()
+    try:
+        accounts = AccountingService(db).get_accounts(company_id)
+        labels = [f"{a.number} - {a.name}" for a in accounts]
+        return labels, {label: a.number for label, a in zip(labels, accounts)}
+    finally:
+        db.close()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _account_ids(company_id: int) -> dict[str, int]:
+    """Hämta mappningen kontonummer -> konto-id från cachen"""
+    db = SessionLocal()
+    try:
+        return {a.number: a.id for a in AccountingService(db).get_accounts(company_id)}
+    finally:
+        db.close()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _account_positions(company_id: int) -> dict[str, int]:
+    """Hämta mappningen kontonummer -> position bland kontovalen från cachen"""
+    labels, numbers = _account_options(company_id)
+    return {numbers[label]: i for i, label in enumerate(labels)}
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _company_options() -> dict[str, int]:
+    """Hämta företagsval (namn -> id) från cachen"""
+    db = SessionLocal()
+    try:
+        return {c.name: c.id for c in AccountingService(db).get_all_companies()}
+    finally:
+        db.close()
+
+
+def _invalidate_accounts(company_id: int | None = None):
+    """Töm de cachade kontovalen efter att konton skapats eller ändrats"""
+    for cached in (_account_options, _account_ids, _account_positions):
+        if company_id is None:
+            cached.clear()
+        else:
+            cached.clear(company_id)
+
+
 def main():
+    # En session per körning; with-blocket stänger den även när sidan
+    # avbryts med st.rerun()/st.stop() eller ett fel
+    with get_db() as db:
+        _main(db)
+
+
+def _main(db):
     st.sidebar.title("📊 Bokföring")
 
-    db = get_db()
     service = AccountingService(db)
 
     # Företagsväljare
-    companies = service.get_all_companies()
+    company_options = _company_options()
 
-    if companies:
-        company_options = {c.name: c.id for c in companies}
+    if company_options:
         selected_name = st.sidebar.selectbox(
             "Välj företag",
             options=list(company_options.keys())
@@ -84,6 +312,8 @@ def main():
                             accounting_standard=standard
                         )
                         service.load_bas_accounts(company.id)
+                        _invalidate_accounts(company.id)
+                        _company_options.clear()
                         st.success(f"Företaget '{name}' skapat!")
                         st.rerun()
                     except Exception as e:
@@ -92,7 +322,7 @@ def main():
                     st.error("Fyll i alla fält")
 
     # Ta bort företag
-    if companies and st.session_state.selected_company_id:
+    if company_options and st.session_state.selected_company_id:
         with st.sidebar.expander("🗑️ Ta bort företag"):
             current_company = service.get_company(st.session_state.selected_company_id)
             if current_company:
@@ -107,6 +337,12 @@ def main():
                 if st.button("🗑️ Ta bort företag permanent", type="primary"):
                     if confirm_name == current_company.name:
                         if service.delete_company(current_company.id):
+                            _invalidate_fiscal_years(current_company.id)
+                            _invalidate_accounts(current_company.id)
+                            _cached_company.clear(current_company.id)
+                            _cached_assets.clear(current_company.id)
+                            _company_options.clear()
+                            _invalidate_report_caches()
                             st.success(f"Företaget '{current_company.name}' har tagits bort!")
                             st.session_state.selected_company_id = None
                             st.rerun()
@@ -135,15 +371,11 @@ def main():
     elif page == "Inställningar":
         show_settings(service)
 
-    db.close()
-
 
 def show_dashboard(service: AccountingService):
     """Visa dashboard med KPI:er och diagram"""
     import plotly.graph_objects as go
     import plotly.express as px
-    from datetime import datetime, timedelta
-    from decimal import Decimal
 
     st.title("Dashboard")
 
@@ -336,8 +568,6 @@ def show_dashboard(service: AccountingService):
 
         # Beräkna summor
         if transactions:
-            from collections import defaultdict
-
             if time_period == "Månad":
                 period_data = defaultdict(lambda: {'revenue': Decimal(0), 'expenses': Decimal(0), 'balance': Decimal(0)})
                 for tx in transactions:
@@ -537,7 +767,7 @@ def show_transactions(service: AccountingService):
         return
 
     # Hämta alla räkenskapsår för företaget
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Skapa ett räkenskapsår först under Inställningar.")
         return
@@ -571,6 +801,8 @@ def show_transactions(service: AccountingService):
 
     accounts = service.get_accounts(company_id)
     account_options = {f"{a.number} - {a.name}": a.id for a in accounts}
+    # Kontoval med tomt förstaval, byggs en gång och delas av alla rader
+    account_choices = [""] + list(account_options)
 
     with tab1:
         transactions = service.get_transactions(company_id, fiscal_year.id)
@@ -592,6 +824,7 @@ def show_transactions(service: AccountingService):
                     with col_actions:
                         if st.button("🗑️ Ta bort transaktion", key=f"del_tx_{tx.id}", type="secondary"):
                             if service.delete_transaction(tx.id):
+                                _invalidate_report_caches()
                                 st.success("Transaktion borttagen!")
                                 st.rerun()
 
@@ -615,6 +848,7 @@ def show_transactions(service: AccountingService):
                         with col5:
                             if st.button("❌", key=f"del_line_{line.id}", help="Ta bort rad"):
                                 if service.delete_transaction_line(line.id):
+                                    _invalidate_report_caches()
                                     st.success("Rad borttagen!")
                                     st.rerun()
 
@@ -626,7 +860,7 @@ def show_transactions(service: AccountingService):
                     with col_acc:
                         new_account = st.selectbox(
                             "Konto",
-                            [""] + list(account_options.keys()),
+                            account_choices,
                             key=f"new_acc_{tx.id}",
                             label_visibility="collapsed"
                         )
@@ -649,13 +883,13 @@ def show_transactions(service: AccountingService):
                     with col_btn:
                         if st.button("➕", key=f"add_line_{tx.id}", help="Lägg till rad"):
                             if new_account and (new_debit > 0 or new_credit > 0):
-                                from decimal import Decimal
                                 service.add_transaction_line(
                                     transaction_id=tx.id,
                                     account_id=account_options[new_account],
                                     debit=Decimal(str(new_debit)),
                                     credit=Decimal(str(new_credit))
                                 )
+                                _invalidate_report_caches()
                                 st.success("Rad tillagd!")
                                 st.rerun()
                             else:
@@ -677,7 +911,7 @@ def show_transactions(service: AccountingService):
             lines = []
             for i in range(4):
                 with col1:
-                    account = st.selectbox(f"Konto {i+1}", [""] + list(account_options.keys()), key=f"acc_{i}")
+                    account = st.selectbox(f"Konto {i+1}", account_choices, key=f"acc_{i}")
                 with col2:
                     debit = st.number_input(f"Debet {i+1}", min_value=0.0, step=100.0, key=f"deb_{i}")
                 with col3:
@@ -700,6 +934,7 @@ def show_transactions(service: AccountingService):
                             description=description,
                             lines=lines
                         )
+                        _invalidate_report_caches()
                         st.success(f"Transaktion {tx.verification_number} skapad!")
                         st.rerun()
                     except ValueError as e:
@@ -719,8 +954,6 @@ def show_transactions(service: AccountingService):
 def show_transaction_templates(service, company_id, fiscal_year, account_options):
     """Visa och använd konteringsmallar"""
     from app.services.template import TemplateService
-    from app.models import get_db
-    from decimal import Decimal
 
     st.subheader("Konteringsmallar")
 
@@ -728,8 +961,8 @@ def show_transaction_templates(service, company_id, fiscal_year, account_options
     Använd mallar för återkommande transaktioner som momskontering, lön, hyra etc.
     """)
 
-    db = next(get_db())
-    template_service = TemplateService(db)
+    # Återanvänd sidans session i stället för att öppna en ny
+    template_service = TemplateService(service.db)
 
     # Lista mallar
     templates = template_service.get_templates(company_id)
@@ -797,6 +1030,7 @@ def show_transaction_templates(service, company_id, fiscal_year, account_options
                             total_amount=Decimal(str(total_amount)),
                             description=tx_description
                         )
+                        _invalidate_report_caches()
                         st.success(f"Transaktion {tx.verification_number} skapad!")
                         st.rerun()
                     except Exception as e:
@@ -816,11 +1050,12 @@ def show_transaction_templates(service, company_id, fiscal_year, account_options
             st.write("**Konteringsrader:**")
             st.caption("Ange procent av totalbelopp för varje rad. Den sista raden kan vara 'resterande'.")
 
+            account_choices = [""] + list(account_options)
             template_lines = []
             for i in range(4):
                 col1, col2, col3, col4 = st.columns([3, 1, 2, 1])
                 with col1:
-                    acc = st.selectbox(f"Konto", [""] + list(account_options.keys()), key=f"tmpl_acc_{i}")
+                    acc = st.selectbox(f"Konto", account_choices, key=f"tmpl_acc_{i}")
                 with col2:
                     is_debit = st.checkbox("Debet", key=f"tmpl_deb_{i}")
                 with col3:
@@ -853,16 +1088,11 @@ def show_transaction_templates(service, company_id, fiscal_year, account_options
                 else:
                     st.error("Ange namn och minst 2 konteringsrader")
 
-    db.close()
-
 
 def show_accruals(service, company_id, fiscal_year, account_options):
     """Visa och hantera periodiseringar"""
     from app.services.accrual import AccrualService
-    from app.models import get_db
     from app.models.accrual import AccrualType, AccrualFrequency
-    from decimal import Decimal
-    from datetime import date
 
     st.subheader("Periodiseringar")
 
@@ -871,8 +1101,8 @@ def show_accruals(service, company_id, fiscal_year, account_options):
     Transaktioner skapas automatiskt varje månad/kvartal så länge periodiseringen är aktiv.
     """)
 
-    db = next(get_db())
-    accrual_service = AccrualService(db)
+    # Återanvänd sidans session i stället för att öppna en ny
+    accrual_service = AccrualService(service.db)
 
     # Lista aktiva periodiseringar
     accruals = accrual_service.get_accruals(company_id, active_only=True)
@@ -900,9 +1130,11 @@ def show_accruals(service, company_id, fiscal_year, account_options):
                 # Visa bokförda perioder
                 if acc.entries:
                     st.write("**Bokförda perioder:**")
-                    for entry in acc.entries:
-                        status_icon = "✅" if entry.is_booked else "⏳"
-                        st.caption(f"{status_icon} Period {entry.period_number}: {entry.period_date} - {entry.amount:,.2f} kr")
+                    period_lines = [
+                        f"{'✅' if entry.is_booked else '⏳'} Period {entry.period_number}: {entry.period_date} - {entry.amount:,.2f} kr"
+                        for entry in acc.entries
+                    ]
+                    st.caption("  \n".join(period_lines))
 
                 # Avsluta periodisering
                 if st.button("Avsluta periodisering", key=f"deactivate_{acc.id}"):
@@ -916,16 +1148,20 @@ def show_accruals(service, company_id, fiscal_year, account_options):
     st.divider()
     st.write("**Kör periodiseringar**")
 
-    pending = accrual_service.get_pending_entries(company_id)
+    pending_count = accrual_service.get_pending_count(company_id)
 
-    if pending:
-        st.write(f"**{len(pending)} väntande periodiseringar:**")
-        for p in pending[:5]:
-            st.caption(f"- {p['accrual_name']}: Period {p['period_number']} ({p['period_date']}) - {p['amount']:,.2f} kr")
+    if pending_count:
+        pending = accrual_service.get_pending_entries(company_id, limit=5)
+        st.write(f"**{pending_count} väntande periodiseringar:**")
+        st.caption("\n".join(
+            f"- {p['accrual_name']}: Period {p['period_number']} ({p['period_date']}) - {p['amount']:,.2f} kr"
+            for p in pending
+        ))
 
         if st.button("Kör alla väntande periodiseringar", type="primary"):
             entries = accrual_service.run_auto_accruals(company_id)
             if entries:
+                _invalidate_report_caches()
                 st.success(f"{len(entries)} periodiseringstransaktioner skapade!")
                 st.rerun()
             else:
@@ -947,7 +1183,7 @@ def show_accruals(service, company_id, fiscal_year, account_options):
             accrual_type = st.selectbox(
                 "Typ av periodisering",
                 options=[t for t in AccrualType],
-                format_func=lambda x: x.value
+                format_func=attrgetter('value')
             )
             total_amount = st.number_input("Totalbelopp", min_value=0.01, step=100.0)
             periods = st.number_input("Antal perioder", min_value=1, max_value=60, value=12)
@@ -957,7 +1193,7 @@ def show_accruals(service, company_id, fiscal_year, account_options):
             frequency = st.selectbox(
                 "Frekvens",
                 options=[f for f in AccrualFrequency],
-                format_func=lambda x: x.value
+                format_func=attrgetter('value')
             )
             auto_generate = st.checkbox("Generera transaktioner automatiskt", value=True)
 
@@ -1000,8 +1236,6 @@ def show_accruals(service, company_id, fiscal_year, account_options):
             else:
                 st.error("Fyll i alla obligatoriska fält")
 
-    db.close()
-
 
 def show_accounts(service: AccountingService):
     """Visa kontoplan"""
@@ -1017,6 +1251,7 @@ def show_accounts(service: AccountingService):
     if not accounts:
         if st.button("Ladda BAS-kontoplan"):
             service.load_bas_accounts(company_id)
+            _invalidate_accounts(company_id)
             st.success("BAS-kontoplan laddad!")
             st.rerun()
         return
@@ -1026,28 +1261,15 @@ def show_accounts(service: AccountingService):
 
     with tab1:
         # Gruppera per kontoklass
-        classes = {}
-        for acc in accounts:
-            cls = acc.account_class
-            if cls not in classes:
-                classes[cls] = []
-            classes[cls].append(acc)
-
-        class_names = {
-            1: "Tillgångar",
-            2: "Eget kapital och skulder",
-            3: "Intäkter",
-            4: "Kostnader för varor",
-            5: "Övriga externa kostnader",
-            6: "Övriga externa kostnader",
-            7: "Personalkostnader",
-            8: "Finansiella poster"
-        }
+        classes = _bucket_by_class(accounts)
+
+        # Saldon för alla konton i en aggregerad fråga
+        balances = service.get_all_balances(company_id)
 
         for cls in sorted(classes.keys()):
-            with st.expander(f"Klass {cls}: {class_names.get(cls, 'Övrigt')} ({len(classes[cls])} konton)"):
+            with st.expander(f"Klass {cls}: {_CLASS_NAMES.get(int(cls or 0), 'Övrigt')} ({len(classes[cls])} konton)"):
                 for acc in classes[cls]:
-                    balance = service.get_account_balance(acc.id)
+                    balance = balances.get(acc.id, Decimal(0))
                     balance_str = f"{balance:,.2f} kr" if balance != 0 else "-"
                     st.write(f"**{acc.number}** {acc.name} | Saldo: {balance_str}")
 
@@ -1057,7 +1279,8 @@ def show_accounts(service: AccountingService):
 
 def show_opening_balances(service: AccountingService, company_id: int, accounts):
     """Visa och redigera ingående balanser"""
-    from decimal import Decimal
+    from sqlalchemy import update
+    from app.models import Account
 
     st.subheader("Ingående balanser")
     st.write("""
@@ -1066,11 +1289,14 @@ def show_opening_balances(service: AccountingService, company_id: int, accounts)
     """)
 
     # Filtrera till balanskonton (klass 1-2)
-    balance_accounts = [a for a in accounts if a.is_balance_account]
+    buckets = _bucket_by_class(accounts)
+    assets = buckets["1"]
+    liabilities = buckets["2"]
+    balance_accounts = assets + liabilities
 
     # Visa summa för kontroll
-    total_assets = sum(a.opening_balance or Decimal(0) for a in balance_accounts if a.number.startswith('1'))
-    total_liabilities = sum(a.opening_balance or Decimal(0) for a in balance_accounts if a.number.startswith('2'))
+    total_assets = sum(a.opening_balance or Decimal(0) for a in assets)
+    total_liabilities = sum(a.opening_balance or Decimal(0) for a in liabilities)
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -1092,62 +1318,98 @@ def show_opening_balances(service: AccountingService, company_id: int, accounts)
     # Hämta db-session från service
     db = service.db
 
-    # Visa tillgångar (klass 1)
-    st.write("#### Tillgångar (klass 1)")
-    assets = [a for a in balance_accounts if a.number.startswith('1')]
+    # Alla ändringar samlas i ett formulär och sparas i en enda commit
+    with st.form("ib_edit"):
+        new_balances = {}
 
-    for acc in assets:
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.write(f"**{acc.number}** {acc.name}")
-        with col2:
-            current_balance = float(acc.opening_balance or 0)
-            new_balance = st.number_input(
-                f"IB {acc.number}",
-                value=current_balance,
-                step=100.0,
-                format="%.2f",
-                key=f"ib_{acc.number}",
-                label_visibility="collapsed"
-            )
-            if new_balance != current_balance:
-                acc.opening_balance = Decimal(str(new_balance))
-                db.commit()
-                st.rerun()
+        # Visa tillgångar (klass 1)
+        st.write("#### Tillgångar (klass 1)")
+        for acc in assets:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(f"**{acc.number}** {acc.name}")
+            with col2:
+                new_balances[acc.id] = st.number_input(
+                    f"IB {acc.number}",
+                    value=float(acc.opening_balance or 0),
+                    step=100.0,
+                    format="%.2f",
+                    key=f"ib_{acc.number}",
+                    label_visibility="collapsed"
+                )
 
-    st.write("#### Eget kapital och skulder (klass 2)")
-    liabilities = [a for a in balance_accounts if a.number.startswith('2')]
+        st.write("#### Eget kapital och skulder (klass 2)")
+        for acc in liabilities:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(f"**{acc.number}** {acc.name}")
+            with col2:
+                new_balances[acc.id] = st.number_input(
+                    f"IB {acc.number}",
+                    value=float(acc.opening_balance or 0),
+                    step=100.0,
+                    format="%.2f",
+                    key=f"ib_{acc.number}",
+                    label_visibility="collapsed"
+                )
 
-    for acc in liabilities:
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.write(f"**{acc.number}** {acc.name}")
-        with col2:
-            current_balance = float(acc.opening_balance or 0)
-            new_balance = st.number_input(
-                f"IB {acc.number}",
-                value=current_balance,
-                step=100.0,
-                format="%.2f",
-                key=f"ib_{acc.number}",
-                label_visibility="collapsed"
-            )
-            if new_balance != current_balance:
-                acc.opening_balance = Decimal(str(new_balance))
+        if st.form_submit_button("Spara ingående balanser", type="primary"):
+            changed = {
+                acc.id: Decimal(str(new_balances[acc.id]))
+                for acc in balance_accounts
+                if new_balances[acc.id] != float(acc.opening_balance or 0)
+            }
+            if changed:
+                db.bulk_update_mappings(
+                    Account,
+                    [{"id": acc_id, "opening_balance": value} for acc_id, value in changed.items()]
+                )
                 db.commit()
+                _invalidate_report_caches()
+                st.success(f"{len(changed)} ingående balanser sparade!")
                 st.rerun()
+            else:
+                st.info("Inga ändringar att spara")
 
     st.divider()
 
     # Nollställ alla ingående balanser
     if st.button("Nollställ alla ingående balanser", type="secondary"):
-        for acc in balance_accounts:
-            acc.opening_balance = Decimal(0)
+        # En UPDATE-sats för alla balanskonton i stället för en per konto
+        db.execute(
+            update(Account)
+            .where(
+                Account.company_id == company_id,
+                Account.id.in_([acc.id for acc in balance_accounts])
+            )
+            .values(opening_balance=Decimal(0))
+        )
         db.commit()
+        _invalidate_report_caches()
+        # Släpp widgetvärdena så att formuläret visar de nollställda värdena
+        for acc in balance_accounts:
+            st.session_state.pop(f"ib_{acc.number}", None)
         st.success("Alla ingående balanser nollställda!")
         st.rerun()
 
 
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def _generate_report(internal_type: str, company_id: int, fiscal_year_id: int, output_format: str, kwargs_items: tuple) -> tuple:
+    """
+    Generera exporterad rapport, cachad per rapport, period och format
+
+    Nedladdningsknappen orsakar en omkörning av skriptet - cachen gör att
+    rapporten inte renderas om (PDF/Word är dyra) vid varje klick.
+    """
+    db = SessionLocal()
+    try:
+        return ReportGenerator(db).generate_report_with_export(
+            internal_type, company_id, fiscal_year_id, output_format, **dict(kwargs_items)
+        )
+    finally:
+        db.close()
+
+
 def show_report_export_buttons(db, report_type: str, company_id: int, fiscal_year_id: int, **kwargs):
     """Visa exportknappar för rapporter"""
     st.divider()
@@ -1155,72 +1417,52 @@ def show_report_export_buttons(db, report_type: str, company_id: int, fiscal_yea
 
     col1, col2, col3, col4 = st.columns(4)
 
-    report_generator = ReportGenerator(db)
-
-    # Mappa rapporttyp till intern nyckel
-    type_map = {
-        "Balansräkning": "balance_sheet",
-        "Resultaträkning": "income_statement",
-        "Råbalans": "trial_balance",
-        "Huvudbok": "general_ledger",
-        "Årsredovisning": "annual_report",
-    }
-    internal_type = type_map.get(report_type)
+    internal_type = _REPORT_TYPE_MAP.get(report_type)
 
     if not internal_type:
         st.info("Export ej tillgänglig för denna rapport")
         return
 
-    try:
-        with col1:
-            if st.button("📄 HTML", key=f"export_html_{report_type}"):
-                data, content_type, filename = report_generator.generate_report_with_export(
-                    internal_type, company_id, fiscal_year_id, "html", **kwargs
-                )
-                st.download_button(
-                    "Ladda ner HTML",
-                    data,
-                    filename,
-                    content_type,
-                    key=f"dl_html_{report_type}"
-                )
+    kwargs_items = tuple(sorted(kwargs.items()))
 
-        with col2:
-            if st.button("📕 PDF", key=f"export_pdf_{report_type}"):
-                try:
-                    data, content_type, filename = report_generator.generate_report_with_export(
-                        internal_type, company_id, fiscal_year_id, "pdf", **kwargs
-                    )
-                    st.download_button(
-                        "Ladda ner PDF",
-                        data,
-                        filename,
-                        content_type,
-                        key=f"dl_pdf_{report_type}"
-                    )
-                except Exception as e:
-                    st.error(f"Kunde inte generera PDF: {e}")
+    # Exporter som användaren begärt ligger kvar i session_state, så att
+    # nedladdningsknappen finns kvar (och hämtas ur cachen) vid omkörning.
+    # Nyckeln omfattar företag, år och urval - byter användaren rapport
+    # genereras inget förrän exportknappen klickas igen.
+    requested = st.session_state.setdefault("requested_exports", set())
+    export_key = (report_type, company_id, fiscal_year_id, kwargs_items)
 
-        with col3:
-            if st.button("📘 Word", key=f"export_docx_{report_type}"):
-                try:
-                    data, content_type, filename = report_generator.generate_report_with_export(
-                        internal_type, company_id, fiscal_year_id, "docx", **kwargs
-                    )
-                    st.download_button(
-                        "Ladda ner Word",
-                        data,
-                        filename,
-                        content_type,
-                        key=f"dl_docx_{report_type}"
-                    )
-                except Exception as e:
-                    st.error(f"Kunde inte generera Word: {e}")
+    export_formats = [
+        (col1, "html", "📄 HTML", "HTML"),
+        (col2, "pdf", "📕 PDF", "PDF"),
+        (col3, "docx", "📘 Word", "Word"),
+    ]
+
+    try:
+        for col, output_format, button_label, format_name in export_formats:
+            with col:
+                if st.button(button_label, key=f"export_{output_format}_{report_type}"):
+                    requested.add((*export_key, output_format))
+
+                if (*export_key, output_format) in requested:
+                    try:
+                        data, content_type, filename = _generate_report(
+                            internal_type, company_id, fiscal_year_id, output_format, kwargs_items
+                        )
+                        st.download_button(
+                            f"Ladda ner {format_name}",
+                            data,
+                            filename,
+                            content_type,
+                            key=f"dl_{output_format}_{report_type}"
+                        )
+                    except Exception as e:
+                        st.error(f"Kunde inte generera {format_name}: {e}")
 
         with col4:
             if st.button("🖨️ Förhandsgranska", key=f"preview_{report_type}"):
-                data, _, _ = report_generator.generate_report_with_export(
-                    internal_type, company_id, fiscal_year_id, "html", **kwargs
+                data, _, _ = _generate_report(
+                    internal_type, company_id, fiscal_year_id, "html", kwargs_items
                 )
                 # Visa förhandsgranskning i full bredd med scrollning
                 st.markdown("---")
@@ -1244,9 +1486,9 @@ def show_reports(service: AccountingService):
         st.info("Välj ett företag först.")
         return
 
-    # Hämta räkenskapsår för export
-    db = get_db()
-    fiscal_years = service.get_fiscal_years(company_id)
+    # Hämta räkenskapsår för export (samma session som tjänsten använder)
+    db = service.db
+    fiscal_years = _fiscal_years(service, company_id)
     fiscal_year = fiscal_years[0] if fiscal_years else None
 
     report_type = st.selectbox(
@@ -1281,12 +1523,50 @@ def show_reports(service: AccountingService):
         show_tax_declaration(service, company_id)
 
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _ledger_index(company_id: int, fiscal_year_id: int, start_date, end_date) -> dict:
+    """
+    Hämta huvudbokens konteringsrader grupperade per konto
+
+    Raderna kommer sorterade på (konto, datum, ver.nr) från databasen och
+    grupperas med groupby. Cachas per (företag, räkenskapsår, period) så att
+    byte av kontogrupp eller konto i huvudboken inte kräver nya databasfrågor.
+    """
+    from itertools import groupby
+    from operator import itemgetter
+
+    db = SessionLocal()
+    try:
+        lines = AccountingService(db).get_ledger_lines(
+            company_id,
+            fiscal_year_id,
+            start_date=start_date,
+            end_date=end_date
+        )
+
+        return {
+            account_id: [
+                {
+                    'date': tx_date,
+                    'ver': ver,
+                    'description': description,
+                    'debit': debit,
+                    'credit': credit
+                }
+                for _, tx_date, ver, description, debit, credit in rows
+            ]
+            for account_id, rows in groupby(lines, key=itemgetter(0))
+        }
+    finally:
+        db.close()
+
+
 def show_general_ledger(service: AccountingService, company_id: int):
     """Visa huvudbok - alla transaktioner per konto"""
     st.subheader("Huvudbok")
 
     # Hämta räkenskapsår
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Inga räkenskapsår finns")
         return
@@ -1310,23 +1590,11 @@ def show_general_ledger(service: AccountingService, company_id: int):
         return
 
     # Filter för kontogrupp
-    account_groups = {
-        "Alla konton": None,
-        "1xxx - Tillgångar": "1",
-        "2xxx - Eget kapital och skulder": "2",
-        "3xxx - Intäkter": "3",
-        "4xxx - Kostnader varor": "4",
-        "5xxx - Övriga externa kostnader": "5",
-        "6xxx - Övriga externa kostnader": "6",
-        "7xxx - Personal": "7",
-        "8xxx - Finansiella poster": "8"
-    }
-
     col1, col2 = st.columns(2)
     with col1:
         selected_group = st.selectbox(
             "Kontogrupp",
-            options=list(account_groups.keys()),
+            options=list(_ACCOUNT_GROUPS.keys()),
             key="gl_group"
         )
     with col2:
@@ -1356,90 +1624,71 @@ def show_general_ledger(service: AccountingService, company_id: int):
     st.divider()
 
     # Filtrera konton
-    group_prefix = account_groups[selected_group]
+    group_prefix = _ACCOUNT_GROUPS[selected_group]
     if selected_account != "Alla":
         # Specifikt konto valt
         acc_number = selected_account.split(" - ")[0]
         filtered_accounts = [a for a in accounts if a.number == acc_number]
     elif group_prefix:
-        filtered_accounts = [a for a in accounts if a.number.startswith(group_prefix)]
+        filtered_accounts = _bucket_by_class(accounts)[group_prefix]
     else:
         filtered_accounts = accounts
 
-    # Hämta alla transaktioner för perioden
-    transactions = service.get_transactions(
-        company_id,
-        fiscal_year.id,
-        start_date=start_date,
-        end_date=end_date
-    )
+    # Transaktionsrader per konto för perioden (cachas, filterbyten är rena uppslag)
+    import numpy as np
+    import pandas as pd
 
-    # Bygg en lookup för transaktionsrader per konto
-    from collections import defaultdict
-    from decimal import Decimal
+    account_transactions = _ledger_index(company_id, fiscal_year.id, start_date, end_date)
 
-    account_transactions = defaultdict(list)
-    for tx in transactions:
-        for line in tx.lines:
-            account_transactions[line.account_id].append({
-                'date': tx.transaction_date,
-                'ver': tx.verification_number,
-                'description': tx.description,
-                'debit': line.debit,
-                'credit': line.credit
-            })
+    # Visa endast konton med aktivitet eller ingående balans
+    active_accounts = [
+        a for a in filtered_accounts
+        if a.id in account_transactions or (a.opening_balance or 0) != 0
+    ]
 
     # Visa huvudbok per konto
-    accounts_with_activity = 0
-
-    for account in sorted(filtered_accounts, key=lambda a: a.number):
+    for account in sorted(active_accounts, key=attrgetter('number')):
         tx_lines = account_transactions.get(account.id, [])
         opening_balance = account.opening_balance or Decimal(0)
 
-        # Visa endast konton med aktivitet eller ingående balans
-        if not tx_lines and opening_balance == 0:
-            continue
-
-        accounts_with_activity += 1
-
         with st.expander(f"**{account.number}** {account.name}", expanded=False):
             # Ingående balans
             st.write(f"**Ingående balans:** {opening_balance:,.2f} kr")
 
             if tx_lines:
-                # Sortera efter datum och ver.nr
-                tx_lines_sorted = sorted(tx_lines, key=lambda x: (x['date'], x['ver']))
-
-                # Visa tabell
-                st.write("| Datum | Ver | Beskrivning | Debet | Kredit | Saldo |")
-                st.write("|-------|-----|-------------|------:|-------:|------:|")
-
-                running_balance = opening_balance
-                total_debit = Decimal(0)
-                total_credit = Decimal(0)
-
-                for line in tx_lines_sorted:
-                    # Beräkna löpande saldo beroende på kontotyp
-                    if account.account_type.value in ['Tillgång', 'Kostnad']:
-                        running_balance += line['debit'] - line['credit']
-                    else:
-                        running_balance += line['credit'] - line['debit']
+                # Raderna är redan sorterade på datum och ver.nr (se _ledger_index)
+                # Löpande saldo beroende på kontotyp, beräknat med cumsum.
+                # Flyttal räcker för visning - summor och utgående balans är exakta.
+                sign = 1 if account.account_type.value in ['Tillgång', 'Kostnad'] else -1
+                movements = np.fromiter(
+                    (float(line['debit']) - float(line['credit']) for line in tx_lines),
+                    dtype=np.float64,
+                    count=len(tx_lines)
+                )
+                running = np.cumsum(sign * movements) + float(opening_balance)
 
-                    total_debit += line['debit']
-                    total_credit += line['credit']
+                total_debit = sum((line['debit'] for line in tx_lines), Decimal(0))
+                total_credit = sum((line['credit'] for line in tx_lines), Decimal(0))
+                running_balance = opening_balance + sign * (total_debit - total_credit)
+                rows = []
 
-                    debit_str = f"{line['debit']:,.2f}" if line['debit'] > 0 else ""
-                    credit_str = f"{line['credit']:,.2f}" if line['credit'] > 0 else ""
+                for line, balance in zip(tx_lines, running):
+                    debit_str = _MONEY(line['debit']) if line['debit'] > 0 else ""
+                    credit_str = _MONEY(line['credit']) if line['credit'] > 0 else ""
                     desc_short = line['description'][:30] + "..." if len(line['description']) > 30 else line['description']
 
-                    st.write(f"| {line['date']} | {line['ver']} | {desc_short} | {debit_str} | {credit_str} | {running_balance:,.2f} |")
+                    rows.append((str(line['date']), str(line['ver']), desc_short, debit_str, credit_str, _MONEY(balance)))
+
+                rows.append(("Summa", "", "", _MONEY(total_debit), _MONEY(total_credit), ""))
 
-                st.write(f"| **Summa** | | | **{total_debit:,.2f}** | **{total_credit:,.2f}** | |")
+                # Visa hela tabellen i ett anrop
+                df_ledger = pd.DataFrame(rows, columns=["Datum", "Ver", "Beskrivning", "Debet", "Kredit", "Saldo"])
+                st.dataframe(df_ledger, use_container_width=True, hide_index=True)
                 st.write(f"**Utgående balans:** {running_balance:,.2f} kr")
             else:
                 st.write("Inga transaktioner under perioden")
 
-    if accounts_with_activity == 0:
+    if not active_accounts:
         st.info("Inga konton med aktivitet för vald period och filter")
 
 
@@ -1448,7 +1697,7 @@ def show_verification_list(service: AccountingService, company_id: int):
     st.subheader("Verifikationslista")
 
     # Hämta räkenskapsår
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Inga räkenskapsår finns")
         return
@@ -1494,12 +1743,7 @@ def show_verification_list(service: AccountingService, company_id: int):
             )
     else:
         # Hämta min/max verifikationsnummer
-        transactions = service.get_transactions(company_id, fiscal_year.id)
-        if transactions:
-            min_ver = min(t.verification_number for t in transactions)
-            max_ver = max(t.verification_number for t in transactions)
-        else:
-            min_ver, max_ver = 1, 1
+        min_ver, max_ver = service.get_verification_range(company_id, fiscal_year.id) or (1, 1)
 
         with col1:
             ver_from = st.number_input(
@@ -1527,7 +1771,8 @@ def show_verification_list(service: AccountingService, company_id: int):
         start_date=start_date,
         end_date=end_date,
         ver_from=ver_from,
-        ver_to=ver_to
+        ver_to=ver_to,
+        eager=True
     )
 
     if not transactions:
@@ -1541,27 +1786,29 @@ def show_verification_list(service: AccountingService, company_id: int):
         st.markdown(f"### Verifikation {tx.verification_number}")
         st.write(f"**Datum:** {tx.transaction_date} | **Beskrivning:** {tx.description}")
 
-        # Konteringsrader som tabell
-        st.write("| Konto | Kontonamn | Debet | Kredit |")
-        st.write("|-------|-----------|------:|-------:|")
+        # Konteringsrader som tabell, byggd som en sträng och visad i ett anrop
+        table = [
+            "| Konto | Kontonamn | Debet | Kredit |",
+            "|-------|-----------|------:|-------:|",
+        ]
 
-        total_debit = 0
-        total_credit = 0
+        total_debit = Decimal(0)
+        total_credit = Decimal(0)
         for line in tx.lines:
-            debit_str = f"{line.debit:,.2f}" if line.debit > 0 else ""
-            credit_str = f"{line.credit:,.2f}" if line.credit > 0 else ""
-            st.write(f"| {line.account.number} | {line.account.name} | {debit_str} | {credit_str} |")
-            total_debit += float(line.debit)
-            total_credit += float(line.credit)
+            debit_str = _MONEY(line.debit) if line.debit > 0 else ""
+            credit_str = _MONEY(line.credit) if line.credit > 0 else ""
+            table.append(f"| {line.account.number} | {line.account.name} | {debit_str} | {credit_str} |")
+            total_debit += line.debit
+            total_credit += line.credit
 
-        st.write(f"| **Summa** | | **{total_debit:,.2f}** | **{total_credit:,.2f}** |")
+        table.append(f"| **Summa** | | **{_MONEY(total_debit)}** | **{_MONEY(total_credit)}** |")
+        st.markdown("\n".join(table))
 
         # Visa bifogat verifikat om det finns
         if hasattr(tx, 'vouchers') and tx.vouchers:
             st.write("**Bifogade verifikat:**")
             for voucher in tx.vouchers:
                 if voucher.file_path:
-                    from pathlib import Path
                     voucher_path = Path(voucher.file_path)
                     if voucher_path.exists():
                         if voucher_path.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif']:
@@ -1599,11 +1846,11 @@ def show_trial_balance(service: AccountingService, company_id: int):
     st.write("|-------|------|------:|-------:|")
 
     for b in balances:
-        debit = f"{b['debit']:,.2f}" if b['debit'] > 0 else ""
-        credit = f"{b['credit']:,.2f}" if b['credit'] > 0 else ""
+        debit = _MONEY(b['debit']) if b['debit'] > 0 else ""
+        credit = _MONEY(b['credit']) if b['credit'] > 0 else ""
         st.write(f"| {b['account_number']} | {b['account_name']} | {debit} | {credit} |")
 
-    st.write(f"| **Summa** | | **{total_debit:,.2f}** | **{total_credit:,.2f}** |")
+    st.write(f"| **Summa** | | **{_MONEY(total_debit)}** | **{_MONEY(total_credit)}** |")
 
     if total_debit == total_credit:
         st.success("✓ Balanserar")
@@ -1622,16 +1869,17 @@ def show_balance_sheet(service: AccountingService, company_id: int):
         st.caption(f"Per balansdagen: {fiscal_year.end_date}")
 
     accounts = service.get_accounts(company_id)
+    buckets = _bucket_by_class(accounts)
+    balances = service.get_all_balances(company_id)
 
     # Tillgångar (klass 1)
     st.write("### TILLGÅNGAR")
     assets_total = 0
-    for acc in accounts:
-        if acc.number.startswith("1"):
-            balance = service.get_account_balance(acc.id)
-            if balance != 0:
-                st.write(f"{acc.number} {acc.name}: {balance:,.2f} kr")
-                assets_total += balance
+    for acc in buckets["1"]:
+        balance = balances.get(acc.id, Decimal(0))
+        if balance != 0:
+            st.write(f"{acc.number} {acc.name}: {balance:,.2f} kr")
+            assets_total += balance
     st.write(f"**Summa tillgångar: {assets_total:,.2f} kr**")
 
     st.divider()
@@ -1639,12 +1887,11 @@ def show_balance_sheet(service: AccountingService, company_id: int):
     # Eget kapital och skulder (klass 2)
     st.write("### EGET KAPITAL OCH SKULDER")
     liabilities_total = 0
-    for acc in accounts:
-        if acc.number.startswith("2"):
-            balance = service.get_account_balance(acc.id)
-            if balance != 0:
-                st.write(f"{acc.number} {acc.name}: {balance:,.2f} kr")
-                liabilities_total += balance
+    for acc in buckets["2"]:
+        balance = balances.get(acc.id, Decimal(0))
+        if balance != 0:
+            st.write(f"{acc.number} {acc.name}: {balance:,.2f} kr")
+            liabilities_total += balance
     st.write(f"**Summa eget kapital och skulder: {liabilities_total:,.2f} kr**")
 
 
@@ -1658,16 +1905,17 @@ def show_income_statement(service: AccountingService, company_id: int):
         st.caption(f"Räkenskapsår: {fiscal_year.start_date} - {fiscal_year.end_date}")
 
     accounts = service.get_accounts(company_id)
+    buckets = _bucket_by_class(accounts)
+    balances = service.get_all_balances(company_id)
 
     # Intäkter (klass 3)
     st.write("### INTÄKTER")
     revenue_total = 0
-    for acc in accounts:
-        if acc.number.startswith("3"):
-            balance = service.get_account_balance(acc.id)
-            if balance != 0:
-                st.write(f"{acc.number} {acc.name}: {balance:,.2f} kr")
-                revenue_total += balance
+    for acc in buckets["3"]:
+        balance = balances.get(acc.id, Decimal(0))
+        if balance != 0:
+            st.write(f"{acc.number} {acc.name}: {balance:,.2f} kr")
+            revenue_total += balance
     st.write(f"**Summa intäkter: {revenue_total:,.2f} kr**")
 
     st.divider()
@@ -1675,10 +1923,9 @@ def show_income_statement(service: AccountingService, company_id: int):
     # Kostnader (klass 4-8)
     st.write("### KOSTNADER")
     expense_total = 0
-    for acc in accounts:
-        first_digit = acc.number[0] if acc.number else ""
-        if first_digit in ["4", "5", "6", "7", "8"]:
-            balance = service.get_account_balance(acc.id)
+    for first_digit in ["4", "5", "6", "7", "8"]:
+        for acc in buckets[first_digit]:
+            balance = balances.get(acc.id, Decimal(0))
             if balance != 0:
                 st.write(f"{acc.number} {acc.name}: {balance:,.2f} kr")
                 expense_total += balance
@@ -1690,20 +1937,60 @@ def show_income_statement(service: AccountingService, company_id: int):
     st.write(f"### ÅRETS RESULTAT: {result:,.2f} kr")
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_vat_report(company_id: int, period_start, period_end) -> dict:
+    """Generera momsrapport, cachad per (företag, period)"""
+    db = SessionLocal()
+    try:
+        return VATReport(db).generate(company_id, period_start, period_end)
+    finally:
+        db.close()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_employer_report(company_id: int, period_start, period_end) -> dict:
+    """Generera arbetsgivardeklaration, cachad per (företag, period)"""
+    db = SessionLocal()
+    try:
+        return EmployerReport(db).generate(company_id, period_start, period_end)
+    finally:
+        db.close()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_ink2(company_id: int, fiscal_year_id: int) -> dict:
+    """Generera INK2-underlag, cachat per (företag, räkenskapsår)"""
+    db = SessionLocal()
+    try:
+        return TaxDeclarationService(db).generate_ink2(company_id, fiscal_year_id)
+    finally:
+        db.close()
+
+
+def _invalidate_report_caches():
+    """Töm cachade rapporter efter att bokföringen ändrats"""
+    for cached in (_ledger_index, _generate_report, _cached_vat_report,
+                   _cached_employer_report, _cached_ink2, _period_result):
+        cached.clear()
+    # Genererat INK2-underlag i session_state bygger på de gamla siffrorna
+    for key in [k for k in st.session_state if k.startswith(("ink2_data_", "ink2_df_"))]:
+        del st.session_state[key]
+
+
 def show_vat_report(service: AccountingService, company_id: int):
     """Visa momsrapport enligt Skatteverkets format"""
     st.subheader("Momsrapport (SKV 4700)")
 
-    from app.services.tax import VATReport
-    from app.models import get_db
-
     # Hämta räkenskapsår
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Inga räkenskapsår finns")
         return
 
     fiscal_year = fiscal_years[0]
+    fy_start = fiscal_year.start_date
+    fy_end = fiscal_year.end_date
+    fy_year = fy_start.year
 
     st.write("Välj rapportperiod:")
 
@@ -1711,69 +1998,53 @@ def show_vat_report(service: AccountingService, company_id: int):
     with col1:
         period_start = st.date_input(
             "Från",
-            value=fiscal_year.start_date,
+            value=fy_start,
             key="vat_start"
         )
     with col2:
         period_end = st.date_input(
             "Till",
-            value=fiscal_year.end_date,
+            value=fy_end,
             key="vat_end"
         )
 
     # Snabbval för perioder
     st.write("**Snabbval:**")
     period_cols = st.columns(4)
-    from datetime import date as date_type
-    from dateutil.relativedelta import relativedelta
 
     with period_cols[0]:
         if st.button("Januari"):
-            year = fiscal_year.start_date.year
-            period_start = date_type(year, 1, 1)
-            period_end = date_type(year, 1, 31)
+            period_start = date(fy_year, 1, 1)
+            period_end = date(fy_year, 1, 31)
     with period_cols[1]:
         if st.button("Q1"):
-            year = fiscal_year.start_date.year
-            period_start = date_type(year, 1, 1)
-            period_end = date_type(year, 3, 31)
+            period_start = date(fy_year, 1, 1)
+            period_end = date(fy_year, 3, 31)
     with period_cols[2]:
         if st.button("Q2"):
-            year = fiscal_year.start_date.year
-            period_start = date_type(year, 4, 1)
-            period_end = date_type(year, 6, 30)
+            period_start = date(fy_year, 4, 1)
+            period_end = date(fy_year, 6, 30)
     with period_cols[3]:
         if st.button("Helår"):
-            period_start = fiscal_year.start_date
-            period_end = fiscal_year.end_date
+            period_start = fy_start
+            period_end = fy_end
 
     if st.button("Generera momsrapport", type="primary"):
-        db = next(get_db())
         try:
-            vat_report = VATReport(db)
-            report = vat_report.generate(company_id, period_start, period_end)
+            report = _cached_vat_report(company_id, period_start, period_end)
 
             st.divider()
             st.write(f"### Momsrapport {report['period_start']} - {report['period_end']}")
 
-            # Försäljning
-            st.write("#### Momspliktiga intäkter")
-            st.write(f"**Ruta 05 - Momspliktig försäljning exkl. moms:** {report['sales_excl_vat']:,.2f} kr")
-
-            st.divider()
-
-            # Utgående moms
-            st.write("#### Utgående moms")
-            st.write(f"**Ruta 10 - Utgående moms 25%:** {report['output_vat_25']:,.2f} kr")
-            st.write(f"**Ruta 11 - Utgående moms 12%:** {report['output_vat_12']:,.2f} kr")
-            st.write(f"**Ruta 12 - Utgående moms 6%:** {report['output_vat_6']:,.2f} kr")
-            st.write(f"**Summa utgående moms:** {report['total_output_vat']:,.2f} kr")
-
-            st.divider()
-
-            # Ingående moms
-            st.write("#### Ingående moms")
-            st.write(f"**Ruta 48 - Ingående moms:** {report['input_vat']:,.2f} kr")
+            # Momspliktiga intäkter, utgående och ingående moms i en tabell
+            _amount_table([
+                ("Ruta 05 - Momspliktig försäljning exkl. moms", report['sales_excl_vat']),
+                ("Ruta 10 - Utgående moms 25%", report['output_vat_25']),
+                ("Ruta 11 - Utgående moms 12%", report['output_vat_12']),
+                ("Ruta 12 - Utgående moms 6%", report['output_vat_6']),
+                ("Summa utgående moms", report['total_output_vat']),
+                ("Ruta 48 - Ingående moms", report['input_vat']),
+            ])
 
             st.divider()
 
@@ -1787,19 +2058,14 @@ def show_vat_report(service: AccountingService, company_id: int):
 
         except Exception as e:
             st.error(f"Fel vid generering: {e}")
-        finally:
-            db.close()
 
 
 def show_employer_report(service: AccountingService, company_id: int):
     """Visa arbetsgivardeklaration"""
     st.subheader("Arbetsgivardeklaration (AGI)")
 
-    from app.services.tax import EmployerReport
-    from app.models import get_db
-
     # Hämta räkenskapsår
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Inga räkenskapsår finns")
         return
@@ -1823,34 +2089,23 @@ def show_employer_report(service: AccountingService, company_id: int):
         )
 
     if st.button("Generera arbetsgivarrapport", type="primary"):
-        db = next(get_db())
         try:
-            employer_report = EmployerReport(db)
-            report = employer_report.generate(company_id, period_start, period_end)
+            report = _cached_employer_report(company_id, period_start, period_end)
 
             st.divider()
             st.write(f"### Arbetsgivardeklaration {report['period_start']} - {report['period_end']}")
 
-            # Löneuppgifter
-            st.write("#### Löneuppgifter")
-            st.write(f"**Bruttolön:** {report['gross_salary']:,.2f} kr")
-            st.write(f"**Semesterersättning:** {report['vacation_pay']:,.2f} kr")
-            st.write(f"**Totalt löneunderlag:** {report['total_salary_base']:,.2f} kr")
-
-            st.divider()
-
-            # Arbetsgivaravgifter
-            st.write("#### Arbetsgivaravgifter")
+            # Löneuppgifter, arbetsgivaravgifter och avdragen skatt i en tabell
+            _amount_table([
+                ("Bruttolön", report['gross_salary']),
+                ("Semesterersättning", report['vacation_pay']),
+                ("Totalt löneunderlag", report['total_salary_base']),
+                ("Beräknade arbetsgivaravgifter", report['calculated_contributions']),
+                ("Bokförda arbetsgivaravgifter (skuld)", report['employer_contributions']),
+                ("Personalens källskatt (skuld)", report['withholding_tax']),
+            ])
             rate_pct = float(report['contribution_rate']) * 100
-            st.write(f"**Avgiftssats:** {rate_pct:.2f}%")
-            st.write(f"**Beräknade arbetsgivaravgifter:** {report['calculated_contributions']:,.2f} kr")
-            st.write(f"**Bokförda arbetsgivaravgifter (skuld):** {report['employer_contributions']:,.2f} kr")
-
-            st.divider()
-
-            # Skatt
-            st.write("#### Avdragen skatt")
-            st.write(f"**Personalens källskatt (skuld):** {report['withholding_tax']:,.2f} kr")
+            st.caption(f"Avgiftssats: {rate_pct:.2f}%")
 
             st.divider()
 
@@ -1865,19 +2120,14 @@ def show_employer_report(service: AccountingService, company_id: int):
 
         except Exception as e:
             st.error(f"Fel vid generering: {e}")
-        finally:
-            db.close()
 
 
 def show_tax_declaration(service: AccountingService, company_id: int):
     """Visa skattedeklarationsunderlag (INK2)"""
     st.subheader("Skattedeklaration INK2 (Aktiebolag)")
 
-    from app.services.tax_declaration import TaxDeclarationService
-    from app.models import get_db
-
     # Hämta räkenskapsår
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Inga räkenskapsår finns")
         return
@@ -1894,7 +2144,7 @@ def show_tax_declaration(service: AccountingService, company_id: int):
     )
     fiscal_year = fiscal_year_options[selected_fy_name]
 
-    db = next(get_db())
+    db = SessionLocal()
     try:
         tax_service = TaxDeclarationService(db)
 
@@ -1909,121 +2159,194 @@ def show_tax_declaration(service: AccountingService, company_id: int):
                     st.info(f"Inskickad: {existing.submitted_at.strftime('%Y-%m-%d')}")
 
         with col2:
-            generate = st.button("Generera underlag", type="primary")
-
-        if generate:
-            with st.spinner("Genererar skatteunderlag..."):
-                data = tax_service.generate_ink2(company_id, fiscal_year.id)
+            if st.button("Generera underlag", type="primary"):
+                with st.spinner("Genererar skatteunderlag..."):
+                    data = _cached_ink2(company_id, fiscal_year.id)
+                    st.session_state[f"ink2_data_{fiscal_year.id}"] = data
+                    st.session_state[f"ink2_df_{fiscal_year.id}"] = _ink2_frames(data)
 
-                # Resultaträkning
-                st.divider()
-                st.write("### Resultaträkning")
-                income = data['income_statement']
+    except Exception as e:
+        st.error(f"Fel: {e}")
+    finally:
+        db.close()
 
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.write("**Intäkter och kostnader**")
-                    st.write(f"R1. Nettoomsättning: {income['R1_revenue']:,.0f} kr")
-                    st.write(f"R2. Varuinköp: {income['R2_goods_cost']:,.0f} kr")
-                    st.write(f"R3. Bruttovinst: {income['R3_gross_profit']:,.0f} kr")
-                    st.write(f"R4. Övriga externa kostnader: {income['R4_other_external']:,.0f} kr")
-                    st.write(f"R5. Personalkostnader: {income['R5_personnel']:,.0f} kr")
-                    st.write(f"R6. Avskrivningar: {income['R6_depreciation']:,.0f} kr")
+    # Genererat underlag visas i ett fragment så att anteckningar och knappar
+    # inte kör om hela vyn (och generate_ink2)
+    if f"ink2_data_{fiscal_year.id}" in st.session_state:
+        _ink2_results(company_id, fiscal_year.id)
+
+
+def _ink2_frames(data: dict) -> dict:
+    """
+    Bygg tabellerna för INK2-underlaget en gång när det genereras
+
+    Tabellerna sparas i session_state bredvid underlaget så att
+    omritningar (t.ex. vid Spara) inte bygger om dem.
+    """
+    income = data['income_statement']
+    assets = data['balance_sheet']['assets']
+    liabilities = data['balance_sheet']['liabilities']
+    return {
+        'income': _amount_frame([
+            ("R1. Nettoomsättning", income['R1_revenue']),
+            ("R2. Varuinköp", income['R2_goods_cost']),
+            ("R3. Bruttovinst", income['R3_gross_profit']),
+            ("R4. Övriga externa kostnader", income['R4_other_external']),
+            ("R5. Personalkostnader", income['R5_personnel']),
+            ("R6. Avskrivningar", income['R6_depreciation']),
+        ]),
+        'financial': _amount_frame([
+            ("R8. Rörelseresultat", income['R8_operating_result']),
+            ("R9. Finansiella intäkter", income['R9_financial_income']),
+            ("R10. Finansiella kostnader", income['R10_financial_expense']),
+        ]),
+        'assets': _amount_frame([
+            ("B1. Immateriella tillgångar", assets['B1_intangible']),
+            ("B2. Materiella tillgångar", assets['B2_tangible']),
+            ("B3. Finansiella tillgångar", assets['B3_financial']),
+            ("B4. Anläggningstillgångar", assets['B4_fixed_assets']),
+            ("B5. Varulager", assets['B5_inventory']),
+            ("B6. Fordringar", assets['B6_receivables']),
+            ("B7. Kassa och bank", assets['B7_cash']),
+        ]),
+        'liabilities': _amount_frame([
+            ("B10. Eget kapital", liabilities['B10_equity']),
+            ("B11. Avsättningar", liabilities['B11_provisions']),
+            ("B12. Långfristiga skulder", liabilities['B12_long_term_debt']),
+            ("B13. Kortfristiga skulder", liabilities['B13_short_term_debt']),
+        ]),
+    }
 
-                with col2:
-                    st.write("**Finansiella poster**")
-                    st.write(f"R8. Rörelseresultat: {income['R8_operating_result']:,.0f} kr")
-                    st.write(f"R9. Finansiella intäkter: {income['R9_financial_income']:,.0f} kr")
-                    st.write(f"R10. Finansiella kostnader: {income['R10_financial_expense']:,.0f} kr")
-                    st.metric("R11. Resultat före skatt", f"{income['R11_result_before_tax']:,.0f} kr")
 
-                # Balansräkning
-                st.divider()
-                st.write("### Balansräkning")
-                balance = data['balance_sheet']
+@st.fragment
+def _ink2_results(company_id: int, fiscal_year_id: int):
+    """Visa genererat INK2-underlag från session_state med spara/skicka-knappar"""
+    data = st.session_state[f"ink2_data_{fiscal_year_id}"]
+    frames = st.session_state.get(f"ink2_df_{fiscal_year_id}")
+    if frames is None:
+        frames = st.session_state[f"ink2_df_{fiscal_year_id}"] = _ink2_frames(data)
 
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.write("**Tillgångar**")
-                    st.write(f"B1. Immateriella tillgångar: {balance['assets']['B1_intangible']:,.0f} kr")
-                    st.write(f"B2. Materiella tillgångar: {balance['assets']['B2_tangible']:,.0f} kr")
-                    st.write(f"B3. Finansiella tillgångar: {balance['assets']['B3_financial']:,.0f} kr")
-                    st.write(f"B4. Anläggningstillgångar: {balance['assets']['B4_fixed_assets']:,.0f} kr")
-                    st.write(f"B5. Varulager: {balance['assets']['B5_inventory']:,.0f} kr")
-                    st.write(f"B6. Fordringar: {balance['assets']['B6_receivables']:,.0f} kr")
-                    st.write(f"B7. Kassa och bank: {balance['assets']['B7_cash']:,.0f} kr")
-                    st.metric("B9. Summa tillgångar", f"{balance['assets']['B9_total_assets']:,.0f} kr")
+    db = SessionLocal()
+    try:
+        tax_service = TaxDeclarationService(db)
+        existing = tax_service.get_declaration(company_id, fiscal_year_id, "INK2")
 
-                with col2:
-                    st.write("**Eget kapital och skulder**")
-                    st.write(f"B10. Eget kapital: {balance['liabilities']['B10_equity']:,.0f} kr")
-                    st.write(f"B11. Avsättningar: {balance['liabilities']['B11_provisions']:,.0f} kr")
-                    st.write(f"B12. Långfristiga skulder: {balance['liabilities']['B12_long_term_debt']:,.0f} kr")
-                    st.write(f"B13. Kortfristiga skulder: {balance['liabilities']['B13_short_term_debt']:,.0f} kr")
-                    st.metric("B14. Summa skulder", f"{balance['liabilities']['B14_total_liabilities']:,.0f} kr")
-
-                # Skatteberäkning
-                st.divider()
-                st.write("### Skatteberäkning")
-                tax = data['tax_calculation']
+        # Resultaträkning
+        st.divider()
+        st.write("### Resultaträkning")
+        income = data['income_statement']
 
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Skattemässigt resultat", f"{tax['taxable_income']:,.0f} kr")
-                with col2:
-                    st.metric("Skattesats", f"{tax['tax_rate']*100:.1f}%")
-                with col3:
-                    st.metric("Beräknad bolagsskatt", f"{tax['calculated_tax']:,.0f} kr")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Intäkter och kostnader**")
+            _amount_table(frames['income'], fmt="{:,.0f} kr")
 
-                # Spara underlag
-                st.divider()
-                notes = st.text_area("Anteckningar", value=existing.notes if existing else "")
+        with col2:
+            st.write("**Finansiella poster**")
+            _amount_table(frames['financial'], fmt="{:,.0f} kr")
+            st.metric("R11. Resultat före skatt", f"{income['R11_result_before_tax']:,.0f} kr")
 
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Spara underlag", type="primary"):
-                        saved = tax_service.save_declaration(
-                            company_id=company_id,
-                            fiscal_year_id=fiscal_year.id,
-                            declaration_type="INK2",
-                            data=data,
-                            notes=notes
-                        )
-                        st.success("Underlag sparat!")
-                        st.rerun()
+        # Balansräkning
+        st.divider()
+        st.write("### Balansräkning")
+        balance = data['balance_sheet']
 
-                with col2:
-                    if existing and existing.status != "submitted":
-                        if st.button("Markera som inskickad"):
-                            tax_service.mark_as_submitted(existing.id)
-                            st.success("Markerad som inskickad!")
-                            st.rerun()
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Tillgångar**")
+            assets = balance['assets']
+            _amount_table(frames['assets'], fmt="{:,.0f} kr")
+            st.metric("B9. Summa tillgångar", f"{assets['B9_total_assets']:,.0f} kr")
 
-                # Föregående år
-                previous = tax_service.get_previous_year_data(company_id, fiscal_year.id)
-                if previous:
-                    st.divider()
-                    with st.expander("Föregående års data"):
-                        st.json(previous)
+        with col2:
+            st.write("**Eget kapital och skulder**")
+            liabilities = balance['liabilities']
+            _amount_table(frames['liabilities'], fmt="{:,.0f} kr")
+            st.metric("B14. Summa skulder", f"{liabilities['B14_total_liabilities']:,.0f} kr")
 
-    except Exception as e:
-        st.error(f"Fel: {e}")
-    finally:
-        db.close()
+        # Skatteberäkning
+        st.divider()
+        st.write("### Skatteberäkning")
+        tax = data['tax_calculation']
 
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Skattemässigt resultat", f"{tax['taxable_income']:,.0f} kr")
+        with col2:
+            st.metric("Skattesats", f"{tax['tax_rate']*100:.1f}%")
+        with col3:
+            st.metric("Beräknad bolagsskatt", f"{tax['calculated_tax']:,.0f} kr")
 
-def show_assets(service: AccountingService, db):
-    """Visa och hantera anläggningstillgångar"""
-    st.title("Anläggningstillgångar")
+        # Spara underlag
+        st.divider()
+        notes = st.text_area("Anteckningar", value=existing.notes if existing else "")
 
-    company_id = st.session_state.selected_company_id
-    if not company_id:
-        st.info("Välj ett företag först.")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Spara underlag", type="primary"):
+                saved = tax_service.save_declaration(
+                    company_id=company_id,
+                    fiscal_year_id=fiscal_year_id,
+                    declaration_type="INK2",
+                    data=data,
+                    notes=notes
+                )
+                st.success("Underlag sparat!")
+                st.rerun()
+
+        with col2:
+            if existing and existing.status != "submitted":
+                if st.button("Markera som inskickad"):
+                    tax_service.mark_as_submitted(existing.id)
+                    st.success("Markerad som inskickad!")
+                    st.rerun()
+
+        # Föregående år - hämtas först när användaren ber om det
+        st.divider()
+        if st.toggle("Visa föregående års data", key=f"ink2_prev_{fiscal_year_id}"):
+            previous = tax_service.get_previous_year_data(company_id, fiscal_year_id)
+            if previous:
+                st.json(previous)
+            else:
+                st.caption("Inget sparat underlag för föregående år")
+
+    except Exception as e:
+        st.error(f"Fel: {e}")
+    finally:
+        db.close()
+
+
+@st.cache_data(ttl=120, show_spinner=False)
+def _cached_assets(company_id: int) -> list[dict]:
+    """
+    Hämta företagets tillgångar som serialiserbara dicts
+
+    Töms per företag när tillgångar registreras eller avskrivningar körs,
+    vid SIE-import och borttagning av företaget samt vid återställning.
+    """
+    db = SessionLocal()
+    try:
+        return [
+            asset._asdict() | {
+                'asset_type': asset.asset_type.value,
+                'depreciation_method': asset.depreciation_method.value,
+            }
+            for asset in DepreciationService(db).get_assets_summary(company_id)
+        ]
+    finally:
+        db.close()
+
+
+def show_assets(service: AccountingService, db):
+    """Visa och hantera anläggningstillgångar"""
+    st.title("Anläggningstillgångar")
+
+    company_id = st.session_state.selected_company_id
+    if not company_id:
+        st.info("Välj ett företag först.")
         return
 
-    from app.services.depreciation import DepreciationService
-    from app.models import AssetType, DepreciationMethod
-    from decimal import Decimal
+    import pandas as pd
 
     dep_service = DepreciationService(db)
 
@@ -2032,46 +2355,85 @@ def show_assets(service: AccountingService, db):
     with tab1:
         st.subheader("Registrerade tillgångar")
 
-        assets = dep_service.get_assets(company_id, active_only=False)
+        assets = _cached_assets(company_id)
 
         if not assets:
             st.info("Inga tillgångar registrerade ännu")
         else:
+            today = date.today()
+            # Ack. avskrivningar och bokfört värde för alla tillgångar i en fråga
+            book_values = dep_service.get_book_values_bulk(company_id, today)
+
+            # Översikt som en tabell i stället för en expander per tillgång
+            rows = []
             for asset in assets:
-                status = "Aktiv" if asset.is_active else "Avyttrad"
-                with st.expander(f"**{asset.name}** ({asset.asset_type.value}) - {status}"):
-                    col1, col2 = st.columns(2)
+                accumulated, book_value = book_values[asset['asset_id']]
+                rows.append((
+                    asset['name'],
+                    asset['asset_type'],
+                    "Aktiv" if asset['is_active'] else "Avyttrad",
+                    str(asset['acquisition_date']),
+                    _MONEY(asset['acquisition_cost']),
+                    _MONEY(accumulated),
+                    _MONEY(book_value)
+                ))
+            df_assets = pd.DataFrame(rows, columns=[
+                "Namn", "Typ", "Status", "Anskaffningsdatum",
+                "Anskaffningsvärde", "Ack. avskrivningar", "Bokfört värde"
+            ])
+            st.dataframe(df_assets, use_container_width=True, hide_index=True)
+
+            # Detaljer och avskrivningsschema endast för vald tillgång
+            assets_by_id = {a['asset_id']: a for a in assets}
+            selected_id = st.selectbox(
+                "Visa detaljer för",
+                options=list(assets_by_id.keys()),
+                format_func=lambda asset_id: assets_by_id[asset_id]['name'],
+                key="asset_detail"
+            )
+            asset = assets_by_id[selected_id]
+            accumulated, book_value = book_values[selected_id]
 
-                    with col1:
-                        st.write(f"**Anskaffningsdatum:** {asset.acquisition_date}")
-                        st.write(f"**Anskaffningsvärde:** {asset.acquisition_cost:,.2f} kr")
-                        st.write(f"**Restvärde:** {asset.residual_value or 0:,.2f} kr")
-                        st.write(f"**Nyttjandeperiod:** {asset.useful_life_months} månader")
+            col1, col2 = st.columns(2)
 
-                    with col2:
-                        from datetime import date as date_type
-                        book_value = asset.get_book_value(date_type.today())
-                        accumulated = asset.get_accumulated_depreciation(date_type.today())
-
-                        st.write(f"**Avskrivningsmetod:** {asset.depreciation_method.value}")
-                        st.write(f"**Ack. avskrivningar:** {accumulated:,.2f} kr")
-                        st.write(f"**Bokfört värde:** {book_value:,.2f} kr")
-                        st.write(f"**Årlig avskrivning:** {asset.annual_depreciation:,.2f} kr")
-
-                    # Avskrivningsschema
-                    with st.expander("Visa avskrivningsschema"):
-                        schedule = dep_service.get_depreciation_schedule(asset, periods=12)
-                        st.write("| Period | Datum | Avskrivning | Ack. | Bokfört värde |")
-                        st.write("|--------|-------|------------:|-----:|--------------:|")
-                        for row in schedule:
-                            st.write(f"| {row['period']} | {row['period_date']} | {row['depreciation']:,.2f} | {row['accumulated']:,.2f} | {row['book_value']:,.2f} |")
+            with col1:
+                st.write(f"**Anskaffningsdatum:** {asset['acquisition_date']}")
+                st.write(f"**Anskaffningsvärde:** {asset['acquisition_cost']:,.2f} kr")
+                st.write(f"**Restvärde:** {asset['residual_value']:,.2f} kr")
+                st.write(f"**Nyttjandeperiod:** {asset['useful_life_months']} månader")
+
+            with col2:
+                st.write(f"**Avskrivningsmetod:** {asset['depreciation_method']}")
+                st.write(f"**Ack. avskrivningar:** {accumulated:,.2f} kr")
+                st.write(f"**Bokfört värde:** {book_value:,.2f} kr")
+                st.write(f"**Årlig avskrivning:** {asset['annual_depreciation']:,.2f} kr")
+
+            # Avskrivningsschema - beräknas först när användaren vill se det
+            if st.toggle("Visa avskrivningsschema", key=f"sched_open_{selected_id}"):
+                schedule = dep_service.get_depreciation_schedule(
+                    dep_service.get_asset(selected_id), periods=12
+                )
+                if schedule:
+                    schedule_df = pd.DataFrame(schedule)[
+                        ['period', 'period_date', 'depreciation', 'accumulated', 'book_value']
+                    ].rename(columns={
+                        'period': "Period", 'period_date': "Datum", 'depreciation': "Avskrivning",
+                        'accumulated': "Ack.", 'book_value': "Bokfört värde",
+                    })
+                    st.dataframe(
+                        schedule_df.style.format(
+                            "{:,.2f}", subset=["Avskrivning", "Ack.", "Bokfört värde"]
+                        ),
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                else:
+                    st.caption("Inga återstående avskrivningar.")
 
     with tab2:
         st.subheader("Registrera ny tillgång")
 
-        accounts = service.get_accounts(company_id)
-        account_list = [f"{a.number} - {a.name}" for a in accounts]
-        account_map = {f"{a.number} - {a.name}": a.number for a in accounts}
+        account_list, account_map = _account_options(company_id)
 
         with st.form("new_asset_form"):
             name = st.text_input("Namn på tillgång")
@@ -2082,11 +2444,10 @@ def show_assets(service: AccountingService, db):
             with col1:
                 asset_type = st.selectbox(
                     "Typ av tillgång",
-                    options=[t.value for t in AssetType],
+                    options=_ASSET_TYPE_VALUES,
                     index=0
                 )
-                from datetime import date as date_type
-                acq_date = st.date_input("Anskaffningsdatum", value=date_type.today())
+                acq_date = st.date_input("Anskaffningsdatum", value=date.today())
                 acq_cost = st.number_input("Anskaffningsvärde (kr)", min_value=0.0, step=1000.0)
 
             with col2:
@@ -2094,7 +2455,7 @@ def show_assets(service: AccountingService, db):
                 useful_life = st.number_input("Nyttjandeperiod (månader)", min_value=1, max_value=600, value=60)
                 dep_method = st.selectbox(
                     "Avskrivningsmetod",
-                    options=[m.value for m in DepreciationMethod],
+                    options=_DEPRECIATION_METHOD_VALUES,
                     index=0
                 )
 
@@ -2125,23 +2486,21 @@ def show_assets(service: AccountingService, db):
                     st.error("Fyll i namn och anskaffningsvärde")
                 else:
                     try:
-                        type_map = {t.value: t for t in AssetType}
-                        method_map = {m.value: m for m in DepreciationMethod}
-
                         asset = dep_service.create_asset(
                             company_id=company_id,
                             name=name,
                             description=description,
-                            asset_type=type_map[asset_type],
+                            asset_type=_ASSET_TYPE_MAP[asset_type],
                             acquisition_date=acq_date,
                             acquisition_cost=Decimal(str(acq_cost)),
                             residual_value=Decimal(str(residual)),
                             useful_life_months=useful_life,
-                            depreciation_method=method_map[dep_method],
+                            depreciation_method=_DEPRECIATION_METHOD_MAP[dep_method],
                             asset_account_number=account_map.get(asset_account) if asset_account != "Automatiskt" else None,
                             depreciation_account_number=account_map.get(dep_account) if dep_account != "Automatiskt" else None,
                             accumulated_account_number=account_map.get(acc_account) if acc_account != "Automatiskt" else None,
                         )
+                        _cached_assets.clear(company_id)
                         st.success(f"Tillgång '{name}' registrerad!")
                         st.rerun()
                     except Exception as e:
@@ -2153,7 +2512,7 @@ def show_assets(service: AccountingService, db):
     with tab4:
         st.subheader("Kör periodavskrivningar")
 
-        fiscal_years = service.get_fiscal_years(company_id)
+        fiscal_years = _fiscal_years(service, company_id)
         if not fiscal_years:
             st.warning("Inga räkenskapsår finns")
             return
@@ -2162,10 +2521,9 @@ def show_assets(service: AccountingService, db):
 
         st.write(f"**Räkenskapsår:** {fiscal_year.start_date} - {fiscal_year.end_date}")
 
-        from datetime import date as date_type
         period_date = st.date_input(
             "Avskrivningsdatum",
-            value=date_type.today(),
+            value=date.today(),
             key="dep_date"
         )
 
@@ -2183,6 +2541,8 @@ def show_assets(service: AccountingService, db):
                     period_date=period_date,
                     period_type=period_type
                 )
+                _cached_assets.clear(company_id)
+                _invalidate_report_caches()
 
                 if transactions:
                     st.success(f"{len(transactions)} avskrivningstransaktioner skapade!")
@@ -2197,17 +2557,13 @@ def show_assets(service: AccountingService, db):
 
 def show_shareholdings(service, db, company_id: int):
     """Visa och hantera aktieinnehav i onoterade bolag"""
-    from app.models import Shareholding, ShareholdingType, ShareholdingTransaction
-    from decimal import Decimal
-    from datetime import date
-
     st.subheader("Aktieinnehav i onoterade bolag")
 
     st.write("""
     Hantera aktieinnehav i dotterbolag, intresseföretag och övriga onoterade aktier.
     """)
 
-    # Lista befintliga innehav
+    # Lista befintliga innehav (transaktionerna hämtas först för valt innehav)
     shareholdings = (
         db.query(Shareholding)
         .filter(Shareholding.company_id == company_id)
@@ -2216,74 +2572,94 @@ def show_shareholdings(service, db, company_id: int):
     )
 
     if shareholdings:
-        # Gruppera per typ
-        grouped = {}
-        for sh in shareholdings:
-            if sh.holding_type not in grouped:
-                grouped[sh.holding_type] = []
-            grouped[sh.holding_type].append(sh)
-
-        for holding_type, holdings in grouped.items():
-            st.write(f"**{holding_type.value}:**")
-
-            for sh in holdings:
-                status = "Aktivt" if sh.is_active else "Avyttrat"
-                with st.expander(f"{sh.target_company_name} ({sh.ownership_percentage or 0:.1f}%) - {status}"):
-                    col1, col2 = st.columns(2)
+        import pandas as pd
 
-                    with col1:
-                        st.write(f"**Org.nummer:** {sh.target_org_number or 'Ej angivet'}")
-                        st.write(f"**Land:** {sh.target_country}")
-                        st.write(f"**Antal aktier:** {sh.num_shares:,}")
-                        if sh.total_shares_in_target:
-                            st.write(f"**Totalt aktier i bolaget:** {sh.total_shares_in_target:,}")
-                        st.write(f"**Ägarandel:** {sh.ownership_percentage or 0:.2f}%")
-                        if sh.voting_percentage:
-                            st.write(f"**Röstandel:** {sh.voting_percentage:.2f}%")
+        # Översikt som en tabell, sorterad per typ och bolag
+        rows = [
+            (
+                sh.target_company_name,
+                sh.holding_type.value,
+                "Aktivt" if sh.is_active else "Avyttrat",
+                f"{sh.ownership_percentage or 0:.1f}%",
+                f"{sh.num_shares:,}",
+                _MONEY(sh.acquisition_cost),
+                _MONEY(sh.book_value)
+            )
+            for sh in shareholdings
+        ]
+        df_holdings = pd.DataFrame(rows, columns=[
+            "Bolag", "Typ", "Status", "Ägarandel", "Antal aktier",
+            "Anskaffningsvärde", "Bokfört värde"
+        ])
+        st.dataframe(df_holdings, use_container_width=True, hide_index=True)
+
+        # Detaljer och transaktioner endast för valt innehav
+        holdings_by_id = {sh.id: sh for sh in shareholdings}
+        selected_id = st.selectbox(
+            "Visa detaljer för",
+            options=list(holdings_by_id.keys()),
+            format_func=lambda sh_id: holdings_by_id[sh_id].target_company_name,
+            key="shareholding_detail"
+        )
+        sh = holdings_by_id[selected_id]
 
-                    with col2:
-                        st.write(f"**Anskaffningsdatum:** {sh.acquisition_date}")
-                        st.write(f"**Anskaffningsvärde:** {sh.acquisition_cost:,.2f} kr")
-                        st.write(f"**Bokfört värde:** {sh.book_value:,.2f} kr")
-                        if sh.total_impairment > 0:
-                            st.write(f"**Nedskrivningar:** {sh.total_impairment:,.2f} kr")
-                        if sh.market_value:
-                            st.write(f"**Marknadsvärde:** {sh.market_value:,.2f} kr")
-                        if sh.total_dividends_received > 0:
-                            st.write(f"**Erhållna utdelningar:** {sh.total_dividends_received:,.2f} kr")
-
-                    if sh.disposal_date:
-                        st.divider()
-                        st.write(f"**Avyttrad:** {sh.disposal_date}")
-                        if sh.disposal_amount:
-                            st.write(f"**Försäljningspris:** {sh.disposal_amount:,.2f} kr")
-                        if sh.disposal_gain_loss:
-                            result_type = "Vinst" if sh.disposal_gain_loss > 0 else "Förlust"
-                            st.write(f"**{result_type}:** {abs(sh.disposal_gain_loss):,.2f} kr")
-
-                    if sh.notes:
-                        st.write(f"**Anteckningar:** {sh.notes}")
-
-                    # Transaktionshistorik
-                    transactions = (
-                        db.query(ShareholdingTransaction)
-                        .filter(ShareholdingTransaction.shareholding_id == sh.id)
-                        .order_by(ShareholdingTransaction.transaction_date.desc())
-                        .all()
-                    )
+        col1, col2 = st.columns(2)
 
-                    if transactions:
-                        st.divider()
-                        st.write("**Transaktioner:**")
-                        for tx in transactions:
-                            type_labels = {
-                                'purchase': 'Köp',
-                                'sale': 'Försäljning',
-                                'dividend': 'Utdelning',
-                                'impairment': 'Nedskrivning',
-                                'reversal': 'Återföring'
-                            }
-                            st.caption(f"{tx.transaction_date} - {type_labels.get(tx.transaction_type, tx.transaction_type)}: {tx.amount:,.2f} kr")
+        with col1:
+            st.write(f"**Org.nummer:** {sh.target_org_number or 'Ej angivet'}")
+            st.write(f"**Land:** {sh.target_country}")
+            st.write(f"**Antal aktier:** {sh.num_shares:,}")
+            if sh.total_shares_in_target:
+                st.write(f"**Totalt aktier i bolaget:** {sh.total_shares_in_target:,}")
+            st.write(f"**Ägarandel:** {sh.ownership_percentage or 0:.2f}%")
+            if sh.voting_percentage:
+                st.write(f"**Röstandel:** {sh.voting_percentage:.2f}%")
+
+        with col2:
+            st.write(f"**Anskaffningsdatum:** {sh.acquisition_date}")
+            st.write(f"**Anskaffningsvärde:** {sh.acquisition_cost:,.2f} kr")
+            st.write(f"**Bokfört värde:** {sh.book_value:,.2f} kr")
+            if sh.total_impairment > 0:
+                st.write(f"**Nedskrivningar:** {sh.total_impairment:,.2f} kr")
+            if sh.market_value:
+                st.write(f"**Marknadsvärde:** {sh.market_value:,.2f} kr")
+            if sh.total_dividends_received > 0:
+                st.write(f"**Erhållna utdelningar:** {sh.total_dividends_received:,.2f} kr")
+
+        if sh.disposal_date:
+            st.divider()
+            st.write(f"**Avyttrad:** {sh.disposal_date}")
+            if sh.disposal_amount:
+                st.write(f"**Försäljningspris:** {sh.disposal_amount:,.2f} kr")
+            if sh.disposal_gain_loss:
+                result_type = "Vinst" if sh.disposal_gain_loss > 0 else "Förlust"
+                st.write(f"**{result_type}:** {abs(sh.disposal_gain_loss):,.2f} kr")
+
+        if sh.notes:
+            st.write(f"**Anteckningar:** {sh.notes}")
+
+        # Transaktionshistorik - hämtas först när användaren ber om den
+        if st.checkbox("Visa transaktioner", key=f"sh_{sh.id}_det"):
+            transactions = (
+                db.query(ShareholdingTransaction)
+                .filter(ShareholdingTransaction.shareholding_id == sh.id)
+                .order_by(ShareholdingTransaction.transaction_date.desc())
+                .limit(100)
+                .all()
+            )
+
+            if transactions:
+                type_labels = {
+                    'purchase': 'Köp',
+                    'sale': 'Försäljning',
+                    'dividend': 'Utdelning',
+                    'impairment': 'Nedskrivning',
+                    'reversal': 'Återföring'
+                }
+                for tx in transactions:
+                    st.caption(f"{tx.transaction_date} - {type_labels.get(tx.transaction_type, tx.transaction_type)}: {tx.amount:,.2f} kr")
+            else:
+                st.caption("Inga transaktioner registrerade")
 
     else:
         st.info("Inga aktieinnehav registrerade")
@@ -2302,8 +2678,8 @@ def show_shareholdings(service, db, company_id: int):
         with col1:
             holding_type = st.selectbox(
                 "Typ av innehav",
-                options=[ht for ht in ShareholdingType],
-                format_func=lambda x: x.value
+                options=_SHAREHOLDING_TYPES,
+                format_func=attrgetter('value')
             )
             target_country = st.text_input("Land", value="Sverige")
             acq_date = st.date_input("Anskaffningsdatum", value=date.today())
@@ -2316,11 +2692,10 @@ def show_shareholdings(service, db, company_id: int):
             voting_pct = st.number_input("Röstandel (%, valfritt)", min_value=0.0, max_value=100.0, step=0.01)
 
         # Koppling till konto
-        accounts = service.get_accounts(company_id)
-        account_options = {f"{a.number} - {a.name}": a.id for a in accounts if a.number.startswith('13')}
+        account_list, account_map = _account_options(company_id)
         selected_account = st.selectbox(
             "Tillgångskonto",
-            options=["Inget"] + list(account_options.keys()),
+            options=["Inget"] + [a for a in account_list if account_map[a].startswith('13')],
             help="Ex: 1310 Andelar i koncernföretag"
         )
 
@@ -2328,6 +2703,13 @@ def show_shareholdings(service, db, company_id: int):
 
         if st.form_submit_button("Registrera innehav", type="primary"):
             if target_name and num_shares > 0 and acq_cost > 0:
+                asset_account = (
+                    service.get_account_by_number(company_id, account_map[selected_account])
+                    if selected_account != "Inget" else None
+                )
+                cost_dec = Decimal(str(acq_cost))
+                # Kolumnerna är Numeric(15, 2) - avrunda till öre som lagras
+                per_share = (cost_dec / Decimal(num_shares)).quantize(_CENT)
                 new_sh = Shareholding(
                     company_id=company_id,
                     target_company_name=target_name,
@@ -2339,28 +2721,26 @@ def show_shareholdings(service, db, company_id: int):
                     ownership_percentage=Decimal(str(ownership_pct)),
                     voting_percentage=Decimal(str(voting_pct)) if voting_pct > 0 else None,
                     acquisition_date=acq_date,
-                    acquisition_cost=Decimal(str(acq_cost)),
-                    acquisition_cost_per_share=Decimal(str(acq_cost / num_shares)),
-                    book_value=Decimal(str(acq_cost)),
-                    asset_account_id=account_options.get(selected_account) if selected_account != "Inget" else None,
+                    acquisition_cost=cost_dec,
+                    acquisition_cost_per_share=per_share,
+                    book_value=cost_dec,
+                    asset_account_id=asset_account.id if asset_account else None,
                     is_active=True,
                     notes=notes if notes else None
                 )
 
-                db.add(new_sh)
-
-                # Skapa initialtransaktion
+                # Skapa initialtransaktion, kopplad via relationen så att
+                # båda sparas i samma commit
                 init_tx = ShareholdingTransaction(
-                    shareholding_id=new_sh.id,
+                    shareholding=new_sh,
                     transaction_type='purchase',
                     transaction_date=acq_date,
                     num_shares=num_shares,
-                    amount=Decimal(str(acq_cost)),
-                    price_per_share=Decimal(str(acq_cost / num_shares)),
+                    amount=cost_dec,
+                    price_per_share=per_share,
                     description=f"Initialt köp av {num_shares} aktier i {target_name}"
                 )
-                db.add(init_tx)
-
+                db.add_all([new_sh, init_tx])
                 db.commit()
                 st.success(f"Aktieinnehav i {target_name} registrerat!")
                 st.rerun()
@@ -2368,6 +2748,16 @@ def show_shareholdings(service, db, company_id: int):
                 st.error("Fyll i namn, antal aktier och anskaffningsvärde")
 
 
+@st.cache_data(ttl=60, show_spinner="Beräknar årsresultat...")
+def _period_result(company_id: int, start: date, end: date) -> Decimal:
+    """Cachat periodresultat (töms via _invalidate_report_caches)"""
+    db = SessionLocal()
+    try:
+        return ClosingService(db).calculate_period_result(company_id, start, end)
+    finally:
+        db.close()
+
+
 def show_closing(service: AccountingService, db):
     """Visa bokslutsrutiner"""
     st.title("Bokslut")
@@ -2377,11 +2767,9 @@ def show_closing(service: AccountingService, db):
         st.info("Välj ett företag först.")
         return
 
-    from app.services.closing import ClosingService
-
     closing_service = ClosingService(db)
 
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Inga räkenskapsår finns")
         return
@@ -2407,7 +2795,6 @@ def show_closing(service: AccountingService, db):
     with tab1:
         st.subheader("Månadsbokslut")
 
-        from datetime import date as date_type
         month_end = st.date_input(
             "Periodens slutdatum",
             value=fiscal_year.end_date,
@@ -2416,6 +2803,7 @@ def show_closing(service: AccountingService, db):
 
         if st.button("Utför månadsbokslut", key="monthly_close"):
             result = closing_service.close_month(company_id, month_end)
+            _invalidate_report_caches()
 
             st.write(f"**Periodens resultat:** {result['result']:,.2f} kr")
 
@@ -2438,7 +2826,6 @@ def show_closing(service: AccountingService, db):
     with tab2:
         st.subheader("Kvartalsbokslut")
 
-        from datetime import date as date_type
         quarter_end = st.date_input(
             "Kvartalets slutdatum",
             value=fiscal_year.end_date,
@@ -2447,6 +2834,7 @@ def show_closing(service: AccountingService, db):
 
         if st.button("Utför kvartalsbokslut", key="quarterly_close"):
             result = closing_service.close_quarter(company_id, quarter_end)
+            _invalidate_report_caches()
 
             st.write(f"**Kvartalets resultat:** {result['result']:,.2f} kr")
 
@@ -2466,7 +2854,7 @@ def show_closing(service: AccountingService, db):
         st.write(f"**Räkenskapsår:** {fiscal_year.start_date} - {fiscal_year.end_date}")
 
         # Beräkna årsresultat
-        result_amount = closing_service.calculate_period_result(
+        result_amount = _period_result(
             company_id,
             fiscal_year.start_date,
             fiscal_year.end_date
@@ -2496,6 +2884,8 @@ def show_closing(service: AccountingService, db):
                     )
 
                     if result['status'] == 'closed':
+                        _invalidate_fiscal_years(company_id)
+                        _invalidate_report_caches()
                         st.success("Årsbokslut genomfört!")
                         st.write(f"**Årets resultat:** {result['result']:,.2f} kr")
                         if result['disposition_transaction']:
@@ -2519,15 +2909,8 @@ def show_settings(service: AccountingService):
         st.info("Välj ett företag först.")
         return
 
-    from app.models import get_db, CompanyDocument, DocumentType, AnnualReport, Company
-    from datetime import date
-    import base64
-
-    db = next(get_db())
-    # Hämta company från samma session som vi använder för att spara
-    company = db.query(Company).filter(Company.id == company_id).first()
-
-    # Flikar för olika inställningar
+    # Flikar för olika inställningar. Varje flik är ett fragment med egen
+    # session, så att en widget i en flik bara kör om den fliken.
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "Företagsuppgifter",
         "Dokument",
@@ -2537,53 +2920,169 @@ def show_settings(service: AccountingService):
     ])
 
     with tab1:
-        show_company_info(service, db, company)
+        show_company_info(company_id)
 
     with tab2:
-        show_company_documents(db, company_id)
+        show_company_documents(company_id)
 
     with tab3:
-        show_annual_reports(service, db, company_id)
+        show_annual_reports(company_id)
 
     with tab4:
-        show_fiscal_years_settings(service, company_id)
+        show_fiscal_years_settings(company_id)
 
     with tab5:
-        show_backup_settings(db)
+        show_backup_settings()
 
-    db.close()
 
+def _seen_version(key: str, version_id: int) -> int:
+    """
+    Registrera versionen som vyn ritas med (optimistisk låsning)
+
+    Returnerar versionen från förra ritningen, dvs. den som användaren såg
+    när formuläret skickades, och sparar den nya till nästa körning.
+    """
+    seen = st.session_state.get(key, version_id)
+    st.session_state[key] = version_id
+    return seen
 
-def show_company_info(service, db, company):
-    """Visa och redigera företagsuppgifter inkl logotyp"""
-    import base64
 
-    st.subheader(f"Företag: {company.name}")
+def _save_versioned(db, obj, key: str, seen: int) -> bool:
+    """
+    Spara ändringar i obj om ingen annan hunnit uppdatera det
+
+    Jämför med versionen användaren såg (från _seen_version) och låter
+    dessutom SQLAlchemy (version_id_col) fånga krockar mellan läsning och
+    commit. Vid krock rullas ändringarna tillbaka och ett fel visas.
+    """
+    try:
+        if obj.version_id != seen:
+            raise StaleDataError()
+        db.commit()
+        return True
+    except StaleDataError:
+        db.rollback()
+        st.error("Någon annan hann uppdatera — läs om och försök igen")
+        return False
+    finally:
+        # Nästa sparning jämförs mot radens nuvarande version
+        st.session_state[key] = obj.version_id
+
+
+def _rerun_fragment():
+    """
+    Kör om bara det aktuella fragmentet (t.ex. en inställningsflik)
+
+    Faller tillbaka på en vanlig rerun om fragmentet körs som en del av
+    hela sidan, där scope="fragment" inte är tillåtet.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+def _with_session(view):
+    """
+    Kör en vy med en egen session som första argument
+
+    Används för fragment: de körs om utan resten av sidan, när sidans
+    session redan är stängd.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with SessionLocal() as db:
+            return view(db, *args, **kwargs)
+    return wrapper
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _logo_bytes(company_id: int, version_id: int):
+    """
+    Hämta företagets logotyp som bytes (None om logotyp saknas)
+
+    version_id ingår i nyckeln - den höjs vid varje ändring av företaget,
+    så en ny eller borttagen logotyp läses om automatiskt.
+    """
+    db = SessionLocal()
+    try:
+        logo = db.query(Company.logo).filter(Company.id == company_id).scalar()
+        # Konvertera från memoryview/bytes till bytes om nödvändigt
+        return bytes(logo) if logo else None
+    finally:
+        db.close()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_company(company_id: int) -> dict:
+    """
+    Hämta företagsuppgifter (utan logotyp) som en ren dict
+
+    Töms när uppgifterna sparas, när företaget tas bort och vid import
+    eller återställning.
+    """
+    db = SessionLocal()
+    try:
+        company = db.get(Company, company_id)
+        return {
+            'name': company.name,
+            'org_number': company.org_number,
+            'accounting_standard': company.accounting_standard.value,
+            'address': company.address,
+            'postal_code': company.postal_code,
+            'city': company.city,
+            'email': company.email,
+            'phone': company.phone,
+            'website': company.website,
+            'version_id': company.version_id,
+        }
+    finally:
+        db.close()
+
+
+@st.fragment
+@_with_session
+def show_company_info(db, company_id: int):
+    """Visa och redigera företagsuppgifter inkl logotyp"""
+    info = _cached_company(company_id)
+    logo_bytes = _logo_bytes(company_id, info['version_id'])
+    version_key = f"company_version_{company_id}"
+    seen_version = _seen_version(version_key, info['version_id'])
+
+    def save_company(**changes) -> bool:
+        """Spara ändringar på företaget i sessionen och töm cachen"""
+        company = db.get(Company, company_id)
+        for field, value in changes.items():
+            setattr(company, field, value)
+        saved = _save_versioned(db, company, version_key, seen_version)
+        _cached_company.clear(company_id)
+        if 'name' in changes:
+            _company_options.clear()
+        return saved
+
+    st.subheader(f"Företag: {info['name']}")
 
     col1, col2 = st.columns([2, 1])
 
     with col1:
-        st.write(f"**Organisationsnummer:** {company.org_number}")
-        st.write(f"**Redovisningsstandard:** {company.accounting_standard.value}")
-
-        if company.address:
-            st.write(f"**Adress:** {company.address}")
-        if company.postal_code and company.city:
-            st.write(f"**Postadress:** {company.postal_code} {company.city}")
-        if company.email:
-            st.write(f"**E-post:** {company.email}")
-        if company.phone:
-            st.write(f"**Telefon:** {company.phone}")
-        if company.website:
-            st.write(f"**Webbplats:** {company.website}")
+        st.write(f"**Organisationsnummer:** {info['org_number']}")
+        st.write(f"**Redovisningsstandard:** {info['accounting_standard']}")
+
+        if info['address']:
+            st.write(f"**Adress:** {info['address']}")
+        if info['postal_code'] and info['city']:
+            st.write(f"**Postadress:** {info['postal_code']} {info['city']}")
+        if info['email']:
+            st.write(f"**E-post:** {info['email']}")
+        if info['phone']:
+            st.write(f"**Telefon:** {info['phone']}")
+        if info['website']:
+            st.write(f"**Webbplats:** {info['website']}")
 
     with col2:
         # Visa logotyp
-        if company.logo:
-            # Konvertera från memoryview/bytes till bytes om nödvändigt
-            logo_bytes = bytes(company.logo) if company.logo else None
-            if logo_bytes:
-                st.image(logo_bytes, width=150, caption="Företagslogotyp")
+        if logo_bytes:
+            st.image(logo_bytes, width=150, caption="Företagslogotyp")
         else:
             st.info("Ingen logotyp uppladdad")
 
@@ -2592,28 +3091,30 @@ def show_company_info(service, db, company):
     # Redigera företagsuppgifter
     with st.expander("Redigera företagsuppgifter"):
         with st.form("edit_company"):
-            name = st.text_input("Företagsnamn", value=company.name)
-            address = st.text_input("Gatuadress", value=company.address or "")
+            name = st.text_input("Företagsnamn", value=info['name'])
+            address = st.text_input("Gatuadress", value=info['address'] or "")
             col1, col2 = st.columns(2)
             with col1:
-                postal_code = st.text_input("Postnummer", value=company.postal_code or "")
+                postal_code = st.text_input("Postnummer", value=info['postal_code'] or "")
             with col2:
-                city = st.text_input("Ort", value=company.city or "")
-            email = st.text_input("E-post", value=company.email or "")
-            phone = st.text_input("Telefon", value=company.phone or "")
-            website = st.text_input("Webbplats", value=company.website or "")
+                city = st.text_input("Ort", value=info['city'] or "")
+            email = st.text_input("E-post", value=info['email'] or "")
+            phone = st.text_input("Telefon", value=info['phone'] or "")
+            website = st.text_input("Webbplats", value=info['website'] or "")
 
             if st.form_submit_button("Spara ändringar"):
-                company.name = name
-                company.address = address
-                company.postal_code = postal_code
-                company.city = city
-                company.email = email
-                company.phone = phone
-                company.website = website
-                db.commit()
-                st.success("Uppgifter uppdaterade!")
-                st.rerun()
+                if save_company(
+                    name=name,
+                    address=address,
+                    postal_code=postal_code,
+                    city=city,
+                    email=email,
+                    phone=phone,
+                    website=website
+                ):
+                    st.success("Uppgifter uppdaterade!")
+                    # Hela appen - företagsnamnet visas även i sidomenyn
+                    st.rerun()
 
     # Ladda upp logotyp
     st.write("**Logotyp**")
@@ -2624,33 +3125,44 @@ def show_company_info(service, db, company):
     )
 
     if uploaded_logo:
+        logo_data = _upload_bytes(uploaded_logo, "logo")
+
         # Förhandsgranska
-        st.image(uploaded_logo, width=150, caption="Förhandsgranskning")
+        st.image(logo_data, width=150, caption="Förhandsgranskning")
 
         if st.button("Spara logotyp", type="primary"):
-            logo_data = uploaded_logo.read()
-            company.logo = logo_data
-            company.logo_filename = uploaded_logo.name
-            company.logo_mimetype = uploaded_logo.type
-            db.commit()
-            st.success("Logotyp sparad!")
-            st.rerun()
-
-    if company.logo:
+            if save_company(
+                logo=logo_data,
+                logo_filename=uploaded_logo.name,
+                logo_mimetype=uploaded_logo.type
+            ):
+                st.success("Logotyp sparad!")
+                _rerun_fragment()
+
+    if logo_bytes:
         if st.button("Ta bort logotyp"):
-            company.logo = None
-            company.logo_filename = None
-            company.logo_mimetype = None
-            db.commit()
-            st.success("Logotyp borttagen!")
-            st.rerun()
+            if save_company(logo=None, logo_filename=None, logo_mimetype=None):
+                st.success("Logotyp borttagen!")
+                _rerun_fragment()
 
 
+def _document_file(document_id: int) -> bytes:
+    """Hämta ett dokuments fildata (anropas av download_button vid klick)"""
+    db = SessionLocal()
+    try:
+        return (
+            db.query(CompanyDocument.file_data)
+            .filter(CompanyDocument.id == document_id)
+            .scalar()
+        )
+    finally:
+        db.close()
+
+
+@st.fragment
+@_with_session
 def show_company_documents(db, company_id: int):
     """Visa och hantera företagsdokument med versionshistorik"""
-    from app.models import CompanyDocument, DocumentType
-    from datetime import date
-
     st.subheader("Företagsdokument")
 
     st.write("""
@@ -2658,15 +3170,26 @@ def show_company_documents(db, company_id: int):
     Dokumenten versionshanteras automatiskt - gamla versioner sparas som historik.
     """)
 
-    # Lista befintliga dokument
+    # Lista befintliga dokument (fildata hämtas först vid nedladdning)
     documents = (
         db.query(CompanyDocument)
+        .options(defer(CompanyDocument.file_data))
         .filter(CompanyDocument.company_id == company_id, CompanyDocument.is_current == True)
         .order_by(CompanyDocument.document_type, CompanyDocument.uploaded_at.desc())
         .all()
     )
 
     if documents:
+        # Versionshistorik för alla dokumenttyper i en fråga
+        previous_by_type = defaultdict(list)
+        for old_doc in (
+            db.query(CompanyDocument)
+            .options(defer(CompanyDocument.file_data))
+            .filter(CompanyDocument.company_id == company_id, CompanyDocument.is_current == False)
+            .order_by(CompanyDocument.document_type, CompanyDocument.version.desc())
+        ):
+            previous_by_type[old_doc.document_type].append(old_doc)
+
         for doc in documents:
             with st.expander(f"{doc.document_type.value}: {doc.name}"):
                 col1, col2 = st.columns([2, 1])
@@ -2692,23 +3215,15 @@ def show_company_documents(db, company_id: int):
                     # Ladda ner
                     st.download_button(
                         "Ladda ner",
-                        data=doc.file_data,
+                        data=partial(_document_file, doc.id),
                         file_name=doc.filename,
                         mime=doc.mimetype,
-                        key=f"dl_{doc.id}"
+                        key=f"dl_{doc.id}",
+                        on_click="ignore"
                     )
 
                 # Visa versionshistorik
-                previous_versions = (
-                    db.query(CompanyDocument)
-                    .filter(
-                        CompanyDocument.company_id == company_id,
-                        CompanyDocument.document_type == doc.document_type,
-                        CompanyDocument.is_current == False
-                    )
-                    .order_by(CompanyDocument.version.desc())
-                    .all()
-                )
+                previous_versions = previous_by_type.get(doc.document_type, [])
 
                 if previous_versions:
                     st.write("**Tidigare versioner:**")
@@ -2719,10 +3234,11 @@ def show_company_documents(db, company_id: int):
                         with col2:
                             st.download_button(
                                 "Ladda ner",
-                                data=old_doc.file_data,
+                                data=partial(_document_file, old_doc.id),
                                 file_name=f"v{old_doc.version}_{old_doc.filename}",
                                 mime=old_doc.mimetype,
-                                key=f"dl_old_{old_doc.id}"
+                                key=f"dl_old_{old_doc.id}",
+                                on_click="ignore"
                             )
     else:
         st.info("Inga dokument uppladdade")
@@ -2735,8 +3251,8 @@ def show_company_documents(db, company_id: int):
     with st.form("upload_document"):
         doc_type = st.selectbox(
             "Dokumenttyp",
-            options=[dt for dt in DocumentType],
-            format_func=lambda x: x.value
+            options=_DOC_TYPES,
+            format_func=attrgetter('value')
         )
 
         name = st.text_input("Beskrivande namn", placeholder="T.ex. 'Registreringsbevis 2024'")
@@ -2761,8 +3277,9 @@ def show_company_documents(db, company_id: int):
                 file_data = uploaded_file.read()
 
                 # Kolla om det finns ett befintligt dokument av samma typ
+                # (bara id och version - inte fildatan)
                 existing = (
-                    db.query(CompanyDocument)
+                    db.query(CompanyDocument.id, CompanyDocument.version)
                     .filter(
                         CompanyDocument.company_id == company_id,
                         CompanyDocument.document_type == doc_type,
@@ -2774,7 +3291,9 @@ def show_company_documents(db, company_id: int):
                 new_version = 1
                 if existing:
                     # Markera gamla som icke-aktuell
-                    existing.is_current = False
+                    db.query(CompanyDocument).filter(CompanyDocument.id == existing.id).update(
+                        {CompanyDocument.is_current: False}, synchronize_session=False
+                    )
                     new_version = existing.version + 1
 
                 # Skapa nytt dokument
@@ -2803,16 +3322,28 @@ def show_company_documents(db, company_id: int):
                     st.success(f"Dokument uppdaterat (version {new_version})!")
                 else:
                     st.success("Dokument uppladdat!")
-                st.rerun()
+                _rerun_fragment()
             else:
                 st.error("Fyll i namn och välj en fil")
 
 
-def show_annual_reports(service, db, company_id: int):
-    """Visa register över inskickade årsredovisningar"""
-    from app.models import AnnualReport
-    from datetime import date
+def _annual_report_file(report_id: int) -> bytes:
+    """Hämta en årsredovisnings PDF (anropas av download_button vid klick)"""
+    db = SessionLocal()
+    try:
+        return (
+            db.query(AnnualReport.report_file)
+            .filter(AnnualReport.id == report_id)
+            .scalar()
+        )
+    finally:
+        db.close()
+
 
+@st.fragment
+@_with_session
+def show_annual_reports(db, company_id: int):
+    """Visa register över inskickade årsredovisningar"""
     st.subheader("Årsredovisningar")
 
     st.write("""
@@ -2821,25 +3352,22 @@ def show_annual_reports(service, db, company_id: int):
     """)
 
     # Hämta räkenskapsår
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(AccountingService(db), company_id)
 
-    # Lista befintliga årsredovisningar
+    # Lista befintliga årsredovisningar (PDF:en hämtas först vid nedladdning)
     reports = (
-        db.query(AnnualReport)
+        db.query(AnnualReport, AnnualReport.report_file.isnot(None))
+        .options(defer(AnnualReport.report_file))
         .filter(AnnualReport.company_id == company_id)
         .order_by(AnnualReport.fiscal_year_end.desc())
         .all()
     )
 
     if reports:
-        for report in reports:
-            status_icons = {
-                'draft': '📝',
-                'submitted': '📤',
-                'registered': '✅',
-                'rejected': '❌'
-            }
-            status_icon = status_icons.get(report.status, '❓')
+        for report, has_file in reports:
+            status_icon = _REPORT_STATUS_ICONS.get(report.status, '❓')
+            version_key = f"annual_report_version_{report.id}"
+            seen_version = _seen_version(version_key, report.version_id)
 
             with st.expander(f"{status_icon} {report.fiscal_year_start} - {report.fiscal_year_end}"):
                 col1, col2 = st.columns(2)
@@ -2863,22 +3391,17 @@ def show_annual_reports(service, db, company_id: int):
                 if report.auditor_name:
                     st.write(f"**Revisor:** {report.auditor_name}")
                     if report.auditor_opinion:
-                        opinions = {
-                            'clean': 'Ren revisionsberättelse',
-                            'qualified': 'Med anmärkning',
-                            'adverse': 'Avvikande mening',
-                            'disclaimer': 'Avstår uttalande'
-                        }
-                        st.write(f"**Utlåtande:** {opinions.get(report.auditor_opinion, report.auditor_opinion)}")
+                        st.write(f"**Utlåtande:** {_AUDITOR_OPINIONS.get(report.auditor_opinion, report.auditor_opinion)}")
 
                 # Ladda ner årsredovisning
-                if report.report_file:
+                if has_file:
                     st.download_button(
                         "Ladda ner årsredovisning",
-                        data=report.report_file,
+                        data=partial(_annual_report_file, report.id),
                         file_name=report.report_filename or f"arsredovisning_{report.fiscal_year_end.year}.pdf",
                         mime="application/pdf",
-                        key=f"dl_ar_{report.id}"
+                        key=f"dl_ar_{report.id}",
+                        on_click="ignore"
                     )
 
                 if report.notes:
@@ -2891,8 +3414,8 @@ def show_annual_reports(service, db, company_id: int):
                 with col1:
                     new_status = st.selectbox(
                         "Ändra status",
-                        options=['draft', 'submitted', 'registered', 'rejected'],
-                        index=['draft', 'submitted', 'registered', 'rejected'].index(report.status),
+                        options=_REPORT_STATUSES,
+                        index=_REPORT_STATUS_INDEX[report.status],
                         key=f"status_{report.id}"
                     )
 
@@ -2914,9 +3437,9 @@ def show_annual_reports(service, db, company_id: int):
                     report.status = new_status
                     report.submitted_date = new_submitted if new_submitted else None
                     report.registered_date = new_registered if new_registered else None
-                    db.commit()
-                    st.success("Uppdaterat!")
-                    st.rerun()
+                    if _save_versioned(db, report, version_key, seen_version):
+                        st.success("Uppdaterat!")
+                        _rerun_fragment()
     else:
         st.info("Inga årsredovisningar registrerade")
 
@@ -2949,14 +3472,8 @@ def show_annual_reports(service, db, company_id: int):
         auditor_name = st.text_input("Revisorns namn")
         auditor_opinion = st.selectbox(
             "Revisionsutlåtande",
-            options=[None, 'clean', 'qualified', 'adverse', 'disclaimer'],
-            format_func=lambda x: {
-                None: "Ej granskat",
-                'clean': 'Ren revisionsberättelse',
-                'qualified': 'Med anmärkning',
-                'adverse': 'Avvikande mening',
-                'disclaimer': 'Avstår uttalande'
-            }.get(x, x)
+            options=list(_AUDITOR_OPINIONS),
+            format_func=_AUDITOR_OPINIONS.get
         )
 
         report_file = st.file_uploader("Årsredovisning (PDF)", type=['pdf'])
@@ -2966,16 +3483,16 @@ def show_annual_reports(service, db, company_id: int):
         if st.form_submit_button("Registrera", type="primary"):
             if fiscal_year:
                 # Kolla om det redan finns en för detta räkenskapsår
-                existing = (
-                    db.query(AnnualReport)
+                exists = db.query(
+                    db.query(AnnualReport.id)
                     .filter(
                         AnnualReport.company_id == company_id,
                         AnnualReport.fiscal_year_id == fiscal_year.id
                     )
-                    .first()
-                )
+                    .exists()
+                ).scalar()
 
-                if existing:
+                if exists:
                     st.error("Det finns redan en årsredovisning för detta räkenskapsår")
                 else:
                     new_report = AnnualReport(
@@ -3001,16 +3518,18 @@ def show_annual_reports(service, db, company_id: int):
                     db.add(new_report)
                     db.commit()
                     st.success("Årsredovisning registrerad!")
-                    st.rerun()
+                    _rerun_fragment()
 
 
-def show_fiscal_years_settings(service, company_id: int):
+@st.fragment
+@_with_session
+def show_fiscal_years_settings(db, company_id: int):
     """Visa och hantera räkenskapsår"""
-    from datetime import date
+    service = AccountingService(db)
 
     st.subheader("Räkenskapsår")
 
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
 
     if fiscal_years:
         for fy in fiscal_years:
@@ -3027,16 +3546,52 @@ def show_fiscal_years_settings(service, company_id: int):
         if st.form_submit_button("Skapa räkenskapsår"):
             try:
                 fy = service.create_fiscal_year(company_id, start, end)
+                _invalidate_fiscal_years(company_id)
                 st.success(f"Räkenskapsår {start} - {end} skapat!")
+                # Hela appen - årsredovisningsfliken listar också räkenskapsåren
                 st.rerun()
             except Exception as e:
                 st.error(f"Fel: {e}")
 
 
+def _documents_zip() -> bytes:
+    """
+    Bygg ZIP-export av alla dokument
+
+    Anropas av download_button först när användaren klickar. Dokumenten
+    läses från databasen i omgångar om 50 och komprimeras till en
+    temporär fil, så att de okomprimerade filerna aldrig ligger i minnet
+    samtidigt. Den färdiga ZIP-filen returneras som bytes och hålls i
+    minnet av Streamlit tills den laddats ner.
+    """
+    db = SessionLocal()
+    try:
+        with tempfile.TemporaryFile(suffix=".zip") as tmp:
+            with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                for doc in db.query(CompanyDocument).yield_per(50):
+                    zip_file.writestr(f"{doc.document_type.value}/{doc.filename}", doc.file_data)
+            tmp.seek(0)
+            return tmp.read()
+    finally:
+        db.close()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _list_backups(backup_path: str) -> list[dict]:
+    """Lista backups på backup-platsen (cachat, töms efter backup/återställning)"""
+    return BackupService(db_path="data/bokforing.db", backup_base_path=backup_path).list_backups()
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def _network_available(backup_path: str) -> bool:
+    """Kontrollera backup-platsen högst var femte sekund i stället för varje rerun"""
+    return BackupService(db_path="data/bokforing.db", backup_base_path=backup_path).is_network_available()
+
+
+@st.fragment
+@_with_session
 def show_backup_settings(db):
     """Visa och konfigurera backup-inställningar"""
-    from app.services.backup import BackupService, BackupConfig
-
     st.subheader("Säkerhetskopiering")
 
     st.write("""
@@ -3099,7 +3654,7 @@ def show_backup_settings(db):
         col1, col2 = st.columns(2)
 
         with col1:
-            if backup_service.is_network_available():
+            if _network_available(backup_path):
                 st.success("Nätverksplatsen är tillgänglig")
             else:
                 st.warning("Nätverksplatsen är inte tillgänglig")
@@ -3110,6 +3665,7 @@ def show_backup_settings(db):
                     result = backup_service.create_backup(db)
 
                 if result['success']:
+                    _list_backups.clear()
                     st.success(f"Backup skapad: {result['backup_name']}")
                     config.last_backup = result['backup_name']
                 else:
@@ -3119,7 +3675,7 @@ def show_backup_settings(db):
         st.divider()
         st.write("**Befintliga backups**")
 
-        backups = backup_service.list_backups()
+        backups = _list_backups(backup_path)
         if backups:
             for backup in backups[:10]:  # Visa max 10
                 col1, col2, col3 = st.columns([2, 1, 1])
@@ -3133,6 +3689,15 @@ def show_backup_settings(db):
                         if st.session_state.get(f"confirm_restore_{backup['name']}"):
                             result = backup_service.restore_backup(backup['name'])
                             if result['success']:
+                                # Backupen kan vara från före senaste schemaändringen
+                                upgrade_schema(engine)
+                                _invalidate_fiscal_years()
+                                _invalidate_accounts()
+                                _cached_company.clear()
+                                _cached_assets.clear()
+                                _company_options.clear()
+                                _invalidate_report_caches()
+                                _list_backups.clear()
                                 st.success("Återställd! Starta om appen.")
                             else:
                                 st.error(f"Fel: {result.get('error')}")
@@ -3149,28 +3714,298 @@ def show_backup_settings(db):
     st.write("**Exportera alla dokument**")
     st.write("Ladda ner alla uppladdade dokument som en ZIP-fil.")
 
-    if st.button("Exportera dokument"):
-        from app.models import CompanyDocument
-        import zipfile
-        import io
-
-        documents = db.query(CompanyDocument).all()
-
-        if documents:
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for doc in documents:
-                    filename = f"{doc.document_type.value}/{doc.filename}"
-                    zip_file.writestr(filename, doc.file_data)
-
-            st.download_button(
-                "Ladda ner ZIP",
-                data=zip_buffer.getvalue(),
-                file_name=f"dokument_export_{date.today()}.zip",
-                mime="application/zip"
-            )
-        else:
-            st.info("Inga dokument att exportera")
+    if db.query(func.count(CompanyDocument.id)).scalar():
+        # ZIP-filen byggs först vid klick
+        st.download_button(
+            "Exportera dokument (ZIP)",
+            data=_documents_zip,
+            file_name=f"dokument_export_{date.today()}.zip",
+            mime="application/zip",
+            on_click="ignore"
+        )
+    else:
+        st.info("Inga dokument att exportera")
+
+
+@st.cache_resource
+def _get_processor() -> DocumentProcessor:
+    """Delad DocumentProcessor för hela processen (skapas en gång)"""
+    return DocumentProcessor()
+
+
+@st.cache_data(ttl=3600, max_entries=32, show_spinner="Analyserar dokument...")
+def _ocr(file_bytes: bytes, filename: str):
+    """OCR-tolka ett uppladdat dokument (cachat på filinnehåll och namn)"""
+    return _get_processor().process_file(file_bytes, filename)
+
+
+def _suggestions(uploaded_file, extracted) -> dict:
+    """
+    Kontoförslag för en uppladdad fil, beräknade en gång per fil
+
+    Förslagen sparas i session_state och räknas om först när file_id
+    ändras, så ändringar i formuläret kör inte om klassificeringen.
+    """
+    cached = st.session_state.get("_suggest_scanner")
+    if cached is None or cached[0] != uploaded_file.file_id:
+        cached = st.session_state["_suggest_scanner"] = (
+            uploaded_file.file_id, suggest_accounts(extracted)
+        )
+    return cached[1]
+
+
+def _save_voucher(uploaded_file, file_content: bytes) -> str:
+    """
+    Spara den uppladdade filen som verifikat en gång per uppladdning
+
+    Sökvägen sparas i session_state under file_id, så ytterligare
+    transaktioner från samma fil återanvänder den redan sparade kopian.
+    """
+    cached = st.session_state.get("_voucher_scanner")
+    if cached is None or cached[0] != uploaded_file.file_id:
+        cached = st.session_state["_voucher_scanner"] = (
+            uploaded_file.file_id,
+            _get_processor().save_voucher(file_content, uploaded_file.name)
+        )
+    return cached[1]
+
+
+@st.fragment
+@_with_session
+def show_scan_ocr_form(db, company_id: int, fiscal_year_id: int, uploaded_file, file_content: bytes, extracted):
+    """
+    Formulär för att bokföra OCR-resultatet
+
+    Körs som fragment: ett inskick med valideringsfel kör inte om
+    förhandsgranskningen och OCR-steget för resten av sidan.
+    """
+    service = AccountingService(db)
+    account_list, account_numbers = _account_options(company_id)
+    account_ids = _account_ids(company_id)
+
+    with st.form("ocr_transaction_form"):
+        st.write("**Justera och spara transaktion**")
+
+        tx_date = st.date_input(
+            "Datum",
+            value=extracted.date or date.today(),
+            key="ocr_date"
+        )
+
+        description = st.text_input(
+            "Beskrivning",
+            value=extracted.description or "",
+            key="ocr_desc"
+        )
+
+        total = st.number_input(
+            "Totalbelopp (inkl moms)",
+            value=float(extracted.total_amount or 0),
+            min_value=0.0,
+            step=10.0,
+            key="ocr_total"
+        )
+
+        vat_rate = st.selectbox(
+            "Momssats",
+            options=_VAT_RATES,
+            index=_VAT_RATE_INDEX.get(extracted.vat_rate, 0),
+            key="ocr_vat"
+        )
+
+        suggestions = _suggestions(uploaded_file, extracted)
+        st.write(f"**Kategori:** {suggestions['category']}")
+
+        account_positions = _account_positions(company_id)
+
+        expense_account = st.selectbox(
+            "Kostnadskonto",
+            options=account_list,
+            index=account_positions.get(suggestions['expense_account'], 0),
+            key="ocr_expense"
+        )
+
+        payment_account = st.selectbox(
+            "Betalkonto",
+            options=account_list,
+            index=account_positions.get(suggestions['payment_account'], 0),
+            key="ocr_payment"
+        )
+
+        if st.form_submit_button("Skapa transaktion", type="primary"):
+            if total > 0 and description:
+                try:
+                    # Momsen avrundas först så att nettot plus
+                    # momsen alltid blir exakt totalbeloppet
+                    total_dec = Decimal(str(total)).quantize(_CENT)
+                    vat_amount = (total_dec * _VAT_FACTOR[vat_rate]).quantize(_CENT)
+                    net_amount = total_dec - vat_amount
+
+                    lines = [
+                        {
+                            "account_id": account_ids[account_numbers[expense_account]],
+                            "debit": net_amount,
+                            "credit": Decimal(0)
+                        },
+                        {
+                            "account_id": account_ids[account_numbers[payment_account]],
+                            "debit": Decimal(0),
+                            "credit": total_dec
+                        }
+                    ]
+
+                    if vat_rate > 0:
+                        vat_account_id = account_ids.get(_INPUT_VAT_ACCOUNT)
+                        if vat_account_id:
+                            lines.insert(1, {
+                                "account_id": vat_account_id,
+                                "debit": vat_amount,
+                                "credit": Decimal(0)
+                            })
+
+                    tx = service.create_transaction(
+                        company_id=company_id,
+                        fiscal_year_id=fiscal_year_id,
+                        transaction_date=tx_date,
+                        description=description,
+                        lines=lines
+                    )
+                    _invalidate_report_caches()
+
+                    voucher_path = _save_voucher(uploaded_file, file_content)
+                    st.success(f"Transaktion {tx.verification_number} skapad!")
+                    st.info(f"Verifikat sparat: {voucher_path}")
+                    st.rerun()
+
+                except Exception as e:
+                    st.error(f"Fel vid skapande: {e}")
+            else:
+                st.error("Fyll i belopp och beskrivning")
+
+    with st.expander("Visa extraherad text"):
+        st.text(extracted.raw_text[:2000])
+
+
+@st.fragment
+@_with_session
+def show_scan_manual_form(db, company_id: int, fiscal_year_id: int, uploaded_file, file_content: bytes):
+    """Formulär för manuell kontering av ett skannat dokument (fragment)"""
+    service = AccountingService(db)
+    account_list, account_numbers = _account_options(company_id)
+    account_ids = _account_ids(company_id)
+
+    st.write("**Registrera transaktion manuellt**")
+    st.write("Lägg till konteringsrader. Summa debet måste vara lika med summa kredit.")
+
+    with st.form("manual_transaction_form"):
+        manual_date = st.date_input(
+            "Datum",
+            value=date.today(),
+            key="manual_date"
+        )
+
+        manual_description = st.text_input(
+            "Beskrivning",
+            key="manual_desc"
+        )
+
+        st.write("**Konteringsrader:**")
+
+        # Initiera session state för antal rader
+        if 'manual_rows' not in st.session_state:
+            st.session_state.manual_rows = 4
+
+        # Kontolistan byggs en gång och delas av alla rader
+        row_options = [""] + account_list
+        rows = []
+
+        for i in range(st.session_state.manual_rows):
+            col1, col2, col3 = st.columns([3, 1, 1])
+            with col1:
+                acc = st.selectbox(
+                    f"Konto {i+1}",
+                    options=row_options,
+                    key=f"manual_acc_{i}"
+                )
+            with col2:
+                debit = st.number_input(
+                    f"Debet {i+1}",
+                    min_value=0.0,
+                    step=100.0,
+                    key=f"manual_debit_{i}"
+                )
+            with col3:
+                credit = st.number_input(
+                    f"Kredit {i+1}",
+                    min_value=0.0,
+                    step=100.0,
+                    key=f"manual_credit_{i}"
+                )
+            rows.append((acc, debit, credit))
+
+        manual_lines = [
+            {"account": acc, "debit": debit, "credit": credit}
+            for acc, debit, credit in rows
+            if acc and (debit > 0 or credit > 0)
+        ]
+        total_debit = math.fsum(line["debit"] for line in manual_lines)
+        total_credit = math.fsum(line["credit"] for line in manual_lines)
+
+        # Visa summa
+        st.divider()
+        col_sum1, col_sum2, col_sum3 = st.columns([3, 1, 1])
+        with col_sum1:
+            st.write("**Summa:**")
+        with col_sum2:
+            st.write(f"**{total_debit:,.2f}**")
+        with col_sum3:
+            st.write(f"**{total_credit:,.2f}**")
+
+        # Balansindikator
+        if total_debit > 0 or total_credit > 0:
+            diff = abs(total_debit - total_credit)
+            if diff < 0.01:
+                st.success("Transaktionen balanserar")
+            else:
+                st.error(f"Differens: {diff:,.2f} kr")
+
+        if st.form_submit_button("Spara transaktion", type="primary"):
+            if not manual_description:
+                st.error("Ange en beskrivning")
+            elif len(manual_lines) < 2:
+                st.error("Minst 2 konteringsrader krävs")
+            elif abs(total_debit - total_credit) >= 0.01:
+                st.error("Transaktionen balanserar inte (debet != kredit)")
+            else:
+                try:
+                    # repr() ger floatens kortaste exakta form, avrundad till hela ören
+                    lines = [
+                        {
+                            "account_id": account_ids[account_numbers[line["account"]]],
+                            "debit": Decimal(repr(line["debit"])).quantize(_CENT),
+                            "credit": Decimal(repr(line["credit"])).quantize(_CENT)
+                        }
+                        for line in manual_lines
+                    ]
+
+                    tx = service.create_transaction(
+                        company_id=company_id,
+                        fiscal_year_id=fiscal_year_id,
+                        transaction_date=manual_date,
+                        description=manual_description,
+                        lines=lines
+                    )
+                    _invalidate_report_caches()
+
+                    # Spara verifikat
+                    voucher_path = _save_voucher(uploaded_file, file_content)
+
+                    st.success(f"Transaktion {tx.verification_number} skapad!")
+                    st.info(f"Verifikat sparat: {voucher_path}")
+                    st.rerun()
+
+                except Exception as e:
+                    st.error(f"Fel vid skapande: {e}")
 
 
 def show_document_scanner(service: AccountingService, db):
@@ -3182,7 +4017,7 @@ def show_document_scanner(service: AccountingService, db):
         st.info("Välj ett företag först.")
         return
 
-    fiscal_years = service.get_fiscal_years(company_id)
+    fiscal_years = _fiscal_years(service, company_id)
     if not fiscal_years:
         st.warning("Skapa ett räkenskapsår först under Inställningar.")
         return
@@ -3208,21 +4043,18 @@ def show_document_scanner(service: AccountingService, db):
         st.subheader("Dokument")
         col_preview, col_data = st.columns([1, 1])
 
+        # Läs filinnehåll (en gång per uppladdad fil)
+        file_content = _upload_bytes(uploaded_file, "scanner")
+
         with col_preview:
             if uploaded_file.type.startswith('image/'):
-                st.image(uploaded_file, use_container_width=True)
+                st.image(file_content, use_container_width=True)
             else:
                 st.info(f"PDF: {uploaded_file.name}")
 
-        # Läs filinnehåll
-        file_content = uploaded_file.read()
-        uploaded_file.seek(0)
-
         # Bearbeta dokument med OCR
-        processor = DocumentProcessor()
         try:
-            with st.spinner("Analyserar dokument..."):
-                extracted = processor.process_file(file_content, uploaded_file.name)
+            extracted = _ocr(file_content, uploaded_file.name)
             ocr_success = extracted.raw_text and len(extracted.raw_text) > 10
         except Exception:
             extracted = None
@@ -3242,246 +4074,14 @@ def show_document_scanner(service: AccountingService, db):
         # Flikar för OCR-resultat och manuell registrering
         tab1, tab2 = st.tabs(["OCR-resultat", "Manuell registrering"])
 
-        # Hämta konton för båda flikarna
-        accounts = service.get_accounts(company_id)
-        account_options = {f"{a.number} - {a.name}": a.id for a in accounts}
-        account_list = list(account_options.keys())
-
         with tab1:
             if ocr_success:
-                with st.form("ocr_transaction_form"):
-                    st.write("**Justera och spara transaktion**")
-
-                    from datetime import date as date_type
-
-                    tx_date = st.date_input(
-                        "Datum",
-                        value=extracted.date or date_type.today(),
-                        key="ocr_date"
-                    )
-
-                    description = st.text_input(
-                        "Beskrivning",
-                        value=extracted.description or "",
-                        key="ocr_desc"
-                    )
-
-                    total = st.number_input(
-                        "Totalbelopp (inkl moms)",
-                        value=float(extracted.total_amount or 0),
-                        min_value=0.0,
-                        step=10.0,
-                        key="ocr_total"
-                    )
-
-                    vat_rate = st.selectbox(
-                        "Momssats",
-                        options=[25, 12, 6, 0],
-                        index=0 if not extracted.vat_rate else [25, 12, 6, 0].index(extracted.vat_rate),
-                        key="ocr_vat"
-                    )
-
-                    suggestions = suggest_accounts(extracted)
-                    st.write(f"**Kategori:** {suggestions['category']}")
-
-                    expense_default = next(
-                        (a for a in account_list if a.startswith(suggestions['expense_account'])),
-                        account_list[0] if account_list else None
-                    )
-                    payment_default = next(
-                        (a for a in account_list if a.startswith(suggestions['payment_account'])),
-                        account_list[0] if account_list else None
-                    )
-
-                    expense_account = st.selectbox(
-                        "Kostnadskonto",
-                        options=account_list,
-                        index=account_list.index(expense_default) if expense_default in account_list else 0,
-                        key="ocr_expense"
-                    )
-
-                    payment_account = st.selectbox(
-                        "Betalkonto",
-                        options=account_list,
-                        index=account_list.index(payment_default) if payment_default in account_list else 0,
-                        key="ocr_payment"
-                    )
-
-                    if st.form_submit_button("Skapa transaktion", type="primary"):
-                        if total > 0 and description:
-                            try:
-                                from decimal import Decimal
-
-                                total_dec = Decimal(str(total))
-                                if vat_rate > 0:
-                                    vat_amount = total_dec * Decimal(vat_rate) / Decimal(100 + vat_rate)
-                                    net_amount = total_dec - vat_amount
-                                else:
-                                    vat_amount = Decimal(0)
-                                    net_amount = total_dec
-
-                                lines = [
-                                    {
-                                        "account_id": account_options[expense_account],
-                                        "debit": net_amount.quantize(Decimal('0.01')),
-                                        "credit": Decimal(0)
-                                    },
-                                    {
-                                        "account_id": account_options[payment_account],
-                                        "debit": Decimal(0),
-                                        "credit": total_dec.quantize(Decimal('0.01'))
-                                    }
-                                ]
-
-                                if vat_rate > 0:
-                                    vat_account = next(
-                                        (a for a in accounts if a.number == "2640"),
-                                        None
-                                    )
-                                    if vat_account:
-                                        lines.insert(1, {
-                                            "account_id": vat_account.id,
-                                            "debit": vat_amount.quantize(Decimal('0.01')),
-                                            "credit": Decimal(0)
-                                        })
-
-                                tx = service.create_transaction(
-                                    company_id=company_id,
-                                    fiscal_year_id=fiscal_year.id,
-                                    transaction_date=tx_date,
-                                    description=description,
-                                    lines=lines
-                                )
-
-                                voucher_path = processor.save_voucher(file_content, uploaded_file.name)
-                                st.success(f"Transaktion {tx.verification_number} skapad!")
-                                st.info(f"Verifikat sparat: {voucher_path}")
-                                st.rerun()
-
-                            except Exception as e:
-                                st.error(f"Fel vid skapande: {e}")
-                        else:
-                            st.error("Fyll i belopp och beskrivning")
-
-                with st.expander("Visa extraherad text"):
-                    st.text(extracted.raw_text[:2000] if len(extracted.raw_text) > 2000 else extracted.raw_text)
+                show_scan_ocr_form(company_id, fiscal_year.id, uploaded_file, file_content, extracted)
             else:
                 st.info("Ingen OCR-data tillgänglig. Använd fliken 'Manuell registrering' för att bokföra dokumentet.")
 
         with tab2:
-            st.write("**Registrera transaktion manuellt**")
-            st.write("Lägg till konteringsrader. Summa debet måste vara lika med summa kredit.")
-
-            with st.form("manual_transaction_form"):
-                from datetime import date as date_type
-
-                manual_date = st.date_input(
-                    "Datum",
-                    value=date_type.today(),
-                    key="manual_date"
-                )
-
-                manual_description = st.text_input(
-                    "Beskrivning",
-                    key="manual_desc"
-                )
-
-                st.write("**Konteringsrader:**")
-
-                # Initiera session state för antal rader
-                if 'manual_rows' not in st.session_state:
-                    st.session_state.manual_rows = 4
-
-                manual_lines = []
-                total_debit = 0.0
-                total_credit = 0.0
-
-                for i in range(st.session_state.manual_rows):
-                    col1, col2, col3 = st.columns([3, 1, 1])
-                    with col1:
-                        acc = st.selectbox(
-                            f"Konto {i+1}",
-                            options=[""] + account_list,
-                            key=f"manual_acc_{i}"
-                        )
-                    with col2:
-                        debit = st.number_input(
-                            f"Debet {i+1}",
-                            min_value=0.0,
-                            step=100.0,
-                            key=f"manual_debit_{i}"
-                        )
-                    with col3:
-                        credit = st.number_input(
-                            f"Kredit {i+1}",
-                            min_value=0.0,
-                            step=100.0,
-                            key=f"manual_credit_{i}"
-                        )
-
-                    if acc and (debit > 0 or credit > 0):
-                        manual_lines.append({
-                            "account": acc,
-                            "debit": debit,
-                            "credit": credit
-                        })
-                        total_debit += debit
-                        total_credit += credit
-
-                # Visa summa
-                st.divider()
-                col_sum1, col_sum2, col_sum3 = st.columns([3, 1, 1])
-                with col_sum1:
-                    st.write("**Summa:**")
-                with col_sum2:
-                    st.write(f"**{total_debit:,.2f}**")
-                with col_sum3:
-                    st.write(f"**{total_credit:,.2f}**")
-
-                # Balansindikator
-                if total_debit > 0 or total_credit > 0:
-                    diff = abs(total_debit - total_credit)
-                    if diff < 0.01:
-                        st.success("Transaktionen balanserar")
-                    else:
-                        st.error(f"Differens: {diff:,.2f} kr")
-
-                if st.form_submit_button("Spara transaktion", type="primary"):
-                    if not manual_description:
-                        st.error("Ange en beskrivning")
-                    elif len(manual_lines) < 2:
-                        st.error("Minst 2 konteringsrader krävs")
-                    elif abs(total_debit - total_credit) >= 0.01:
-                        st.error("Transaktionen balanserar inte (debet != kredit)")
-                    else:
-                        try:
-                            from decimal import Decimal
-
-                            lines = []
-                            for line in manual_lines:
-                                lines.append({
-                                    "account_id": account_options[line["account"]],
-                                    "debit": Decimal(str(line["debit"])),
-                                    "credit": Decimal(str(line["credit"]))
-                                })
-
-                            tx = service.create_transaction(
-                                company_id=company_id,
-                                fiscal_year_id=fiscal_year.id,
-                                transaction_date=manual_date,
-                                description=manual_description,
-                                lines=lines
-                            )
-
-                            # Spara verifikat
-                            voucher_path = processor.save_voucher(file_content, uploaded_file.name)
-
-                            st.success(f"Transaktion {tx.verification_number} skapad!")
-                            st.info(f"Verifikat sparat: {voucher_path}")
-                            st.rerun()
-
-                        except Exception as e:
-                            st.error(f"Fel vid skapande: {e}")
+            show_scan_manual_form(company_id, fiscal_year.id, uploaded_file, file_content)
 
     st.divider()
 
@@ -3505,11 +4105,21 @@ def show_document_scanner(service: AccountingService, db):
         """)
 
 
+@st.cache_data(max_entries=4, show_spinner="Läser SIE-fil...")
+def _parse_sie(file_bytes: bytes) -> tuple[SIEData, tuple[date, date] | None]:
+    """
+    Parsa en SIE-fil (cachat på filinnehållet)
+
+    Returnerar den parsade datan samt första och sista
+    transaktionsdatum (None om inga transaktioner har datum).
+    """
+    data = SIEParser().parse(file_bytes)
+    dates = [tx.date for tx in data.transactions if tx.date]
+    return data, ((min(dates), max(dates)) if dates else None)
+
+
 def show_sie_import(db):
     """Visa SIE-import"""
-    from app.services.sie_import import SIEParser
-    from app.services.accounting import AccountingService
-
     st.title("SIE-import")
 
     st.write("""
@@ -3526,10 +4136,9 @@ def show_sie_import(db):
 
     if uploaded_file:
         try:
-            # Läs och parsa filen
-            content = uploaded_file.read().decode('cp437', errors='replace')
-            parser = SIEParser()
-            data = parser.parse(content)
+            # Läs och parsa filen (återanvänds vid reruns med samma fil)
+            content = uploaded_file.getvalue()
+            data, date_range = _parse_sie(content)
 
             st.success(f"Fil laddad: {uploaded_file.name}")
 
@@ -3557,7 +4166,7 @@ def show_sie_import(db):
             st.subheader("Importalternativ")
 
             service = AccountingService(db)
-            companies = service.get_all_companies()
+            company_options = _company_options()
 
             # Val: nytt eller befintligt företag
             import_option = st.radio(
@@ -3568,17 +4177,12 @@ def show_sie_import(db):
 
             if import_option == "Skapa nytt företag från SIE-filen":
                 # Analysera transaktionsdatum för att föreslå räkenskapsår
-                from datetime import date as date_type
-
-                transaction_dates = [tx.date for tx in data.transactions if tx.date]
-
-                if transaction_dates:
-                    min_date = min(transaction_dates)
-                    max_date = max(transaction_dates)
+                if date_range:
+                    min_date, max_date = date_range
 
                     # Föreslå räkenskapsår baserat på transaktioner
-                    suggested_start = date_type(min_date.year, 1, 1)
-                    suggested_end = date_type(min_date.year, 12, 31)
+                    suggested_start = date(min_date.year, 1, 1)
+                    suggested_end = date(min_date.year, 12, 31)
 
                     st.info(f"""
                     **Analys av transaktioner:**
@@ -3588,8 +4192,8 @@ def show_sie_import(db):
                     - **Föreslaget räkenskapsår: {suggested_start} - {suggested_end}**
                     """)
                 else:
-                    suggested_start = data.fiscal_year_start or date_type(date_type.today().year, 1, 1)
-                    suggested_end = data.fiscal_year_end or date_type(date_type.today().year, 12, 31)
+                    suggested_start = data.fiscal_year_start or date(date.today().year, 1, 1)
+                    suggested_end = data.fiscal_year_end or date(date.today().year, 12, 31)
 
                 # Om SIE-filen har räkenskapsår, visa det också
                 if data.fiscal_year_start and data.fiscal_year_end:
@@ -3655,6 +4259,11 @@ def show_sie_import(db):
                             # Importera data till företaget
                             importer = SIEImporter(db)
                             stats = importer.import_file(content, company_id=company.id)
+                            _invalidate_fiscal_years(company.id)
+                            _invalidate_accounts(company.id)
+                            _cached_assets.clear(company.id)
+                            _company_options.clear()
+                            _invalidate_report_caches()
 
                             st.success(f"Import klar! Företaget '{company_name}' skapat.")
                             st.write(f"- Konton importerade: {stats['accounts_imported']}")
@@ -3668,11 +4277,10 @@ def show_sie_import(db):
                             st.error(f"Importfel: {e}")
 
             else:  # Importera till befintligt företag
-                if not companies:
+                if not company_options:
                     st.warning("Inga företag finns. Välj 'Skapa nytt företag' ovan.")
                 else:
                     with st.form("existing_company_import"):
-                        company_options = {c.name: c.id for c in companies}
                         selected_company = st.selectbox(
                             "Välj företag",
                             options=list(company_options.keys())
@@ -3688,6 +4296,12 @@ def show_sie_import(db):
                                 company_id = company_options[selected_company]
                                 importer = SIEImporter(db)
                                 stats = importer.import_file(content, company_id=company_id)
+                                _invalidate_fiscal_years(company_id)
+                                _invalidate_accounts(company_id)
+                                _cached_company.clear(company_id)
+                                _cached_assets.clear(company_id)
+                                _company_options.clear()
+                                _invalidate_report_caches()
 
                                 st.success(f"Import klar till '{selected_company}'!")
                                 st.write(f"- Konton importerade: {stats['accounts_imported']}")
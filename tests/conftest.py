@@ -0,0 +1,109 @@
+"""
+Gemensamma testfixturer för databasen
+"""
+import pytest
+from contextlib import contextmanager
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.models import base
+from app.models.base import Base, SessionLocal
+
+
+# Testerna kör mot en delad minnesdatabas i stället för data/bokforing.db:
+# ingen disk-I/O vid commit och användarens databas rörs aldrig.
+# StaticPool håller den enda anslutningen (och därmed databasen) vid liv.
+engine = create_engine(
+    "sqlite:///file:bokftest?mode=memory&cache=shared&uri=true",
+    connect_args={"uri": True, "check_same_thread": False},
+    poolclass=StaticPool
+)
+
+
+# pysqlite hanterar inte SAVEPOINT korrekt med sin egen transaktionsstyrning:
+# stäng av den och låt SQLAlchemy skicka BEGIN själv
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _emit_begin(connection):
+    connection.exec_driver_sql("BEGIN")
+
+
+def _ddl_scripts():
+    """
+    Kompilera schemat till ett CREATE- och ett DROP-skript
+
+    Hela schemat körs sedan med executescript i ett anrop i stället för
+    att create_all/drop_all inspekterar och skapar tabell för tabell.
+    """
+    tables = Base.metadata.sorted_tables
+    create = []
+    for table in tables:
+        create.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        for index in table.indexes:
+            create.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+    preparer = engine.dialect.identifier_preparer
+    drop = [
+        f"DROP TABLE IF EXISTS {preparer.format_table(table)}"
+        for table in reversed(tables)
+    ]
+    return ";\n".join(create) + ";", ";\n".join(drop) + ";"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    """
+    Peka appens engine och SessionLocal mot testdatabasen och skapa
+    schemat en gång för hela testkörningen
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(base, "engine", engine)
+        mp.setitem(SessionLocal.kw, "bind", engine)
+        create_script, drop_script = _ddl_scripts()
+        with engine.connect() as connection:
+            connection.connection.executescript(create_script)
+        yield
+        with engine.connect() as connection:
+            connection.connection.executescript(drop_script)
+
+
+@contextmanager
+def _rolled_back_session():
+    """
+    Session i en transaktion som rullas tillbaka när blocket lämnas
+
+    Tjänsternas commit() blir SAVEPOINT-släpp inom den yttre
+    transaktionen, så inget test ser ett annat tests data.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def db():
+    """Session som rullas tillbaka efter varje test"""
+    with _rolled_back_session() as session:
+        yield session
+
+
+@pytest.fixture(scope="class")
+def db_class():
+    """Session som delas av en testklass och rullas tillbaka efter den"""
+    with _rolled_back_session() as session:
+        yield session
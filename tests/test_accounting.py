@@ -9,26 +9,31 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.models.base import Base, engine, SessionLocal
 from app.services.accounting import AccountingService
 
 
-@pytest.fixture
-def db():
-    """Skapa en ny databas för varje test"""
-    Base.metadata.create_all(bind=engine)
-    session = SessionLocal()
-    yield session
-    session.close()
-    Base.metadata.drop_all(bind=engine)
-
-
 @pytest.fixture
 def service(db):
     """Skapa en AccountingService"""
     return AccountingService(db)
 
 
+@pytest.fixture
+def seeded_company(service):
+    """Företag med BAS-kontoplan och räkenskapsåret 2024"""
+    company = service.create_company(
+        name="Test AB",
+        org_number="556123-4567"
+    )
+    service.load_bas_accounts(company.id)
+    fiscal_year = service.create_fiscal_year(
+        company.id,
+        date(2024, 1, 1),
+        date(2024, 12, 31)
+    )
+    return company, fiscal_year
+
+
 class TestCompany:
     def test_create_company(self, service):
         """Testa att skapa företag"""
@@ -66,20 +71,20 @@ class TestAccounts:
         assert "3010" in account_numbers  # Försäljning
         assert "2410" in account_numbers  # Leverantörsskulder
 
+    def test_get_account_by_number(self, service, seeded_company):
+        """Testa att upprepade kontouppslag ger samma konto"""
+        company, _ = seeded_company
+
+        bank = service.get_account_by_number(company.id, "1930")
+        assert bank.number == "1930"
+        assert service.get_account_by_number(company.id, "1930") is bank
+        assert service.get_account_by_number(company.id, "0000") is None
+
 
 class TestTransactions:
-    def test_create_transaction(self, service):
+    def test_create_transaction(self, service, seeded_company):
         """Testa att skapa transaktion"""
-        company = service.create_company(
-            name="Test AB",
-            org_number="556123-4567"
-        )
-        accounts = service.load_bas_accounts(company.id)
-        fiscal_year = service.create_fiscal_year(
-            company.id,
-            date(2024, 1, 1),
-            date(2024, 12, 31)
-        )
+        company, fiscal_year = seeded_company
 
         bank = service.get_account_by_number(company.id, "1930")
         sales = service.get_account_by_number(company.id, "3010")
@@ -98,18 +103,9 @@ class TestTransactions:
         assert transaction.verification_number == 1
         assert len(transaction.lines) == 2
 
-    def test_unbalanced_transaction_fails(self, service):
+    def test_unbalanced_transaction_fails(self, service, seeded_company):
         """Testa att obalanserad transaktion kastar fel"""
-        company = service.create_company(
-            name="Test AB",
-            org_number="556123-4567"
-        )
-        accounts = service.load_bas_accounts(company.id)
-        fiscal_year = service.create_fiscal_year(
-            company.id,
-            date(2024, 1, 1),
-            date(2024, 12, 31)
-        )
+        company, fiscal_year = seeded_company
 
         bank = service.get_account_by_number(company.id, "1930")
         sales = service.get_account_by_number(company.id, "3010")
@@ -128,18 +124,9 @@ class TestTransactions:
 
 
 class TestBalance:
-    def test_account_balance(self, service):
+    def test_account_balance(self, service, seeded_company):
         """Testa kontoberäkning"""
-        company = service.create_company(
-            name="Test AB",
-            org_number="556123-4567"
-        )
-        accounts = service.load_bas_accounts(company.id)
-        fiscal_year = service.create_fiscal_year(
-            company.id,
-            date(2024, 1, 1),
-            date(2024, 12, 31)
-        )
+        company, fiscal_year = seeded_company
 
         bank = service.get_account_by_number(company.id, "1930")
         sales = service.get_account_by_number(company.id, "3010")
@@ -163,18 +150,9 @@ class TestBalance:
         assert bank_balance == Decimal("1000")  # Tillgång, debet ökar
         assert sales_balance == Decimal("1000")  # Intäkt, kredit ökar
 
-    def test_trial_balance(self, service):
+    def test_trial_balance(self, service, seeded_company):
         """Testa råbalans"""
-        company = service.create_company(
-            name="Test AB",
-            org_number="556123-4567"
-        )
-        accounts = service.load_bas_accounts(company.id)
-        fiscal_year = service.create_fiscal_year(
-            company.id,
-            date(2024, 1, 1),
-            date(2024, 12, 31)
-        )
+        company, fiscal_year = seeded_company
 
         bank = service.get_account_by_number(company.id, "1930")
         sales = service.get_account_by_number(company.id, "3010")
@@ -193,6 +171,35 @@ class TestBalance:
         trial_balance = service.get_trial_balance(company.id)
 
         assert len(trial_balance) == 2
-        total_debit = sum(b["debit"] for b in trial_balance)
-        total_credit = sum(b["credit"] for b in trial_balance)
-        assert total_debit == total_credit
+        total_debit, total_credit = service.get_trial_balance_totals(company.id)
+        assert total_debit == total_credit == Decimal("1000")
+        assert total_debit == sum(b["debit"] for b in trial_balance)
+
+    def test_all_balances_match_account_balance(self, service, seeded_company):
+        """Testa att aggregerade saldon stämmer med saldo per konto"""
+        company, fiscal_year = seeded_company
+
+        bank = service.get_account_by_number(company.id, "1930")
+        sales = service.get_account_by_number(company.id, "3010")
+        bank.opening_balance = Decimal("250")
+        service.db.commit()
+
+        service.create_transaction(
+            company_id=company.id,
+            fiscal_year_id=fiscal_year.id,
+            transaction_date=date(2024, 1, 15),
+            description="Försäljning",
+            lines=[
+                {"account_id": bank.id, "debit": Decimal("1000"), "credit": Decimal("0")},
+                {"account_id": sales.id, "debit": Decimal("0"), "credit": Decimal("1000")}
+            ]
+        )
+
+        balances = service.get_all_balances(company.id, fiscal_year.id)
+        accounts = service.get_accounts(company.id)
+
+        assert len(balances) == len(accounts)
+        assert balances[bank.id] == Decimal("1250")
+        assert balances[sales.id] == Decimal("-1000")
+        for account in accounts:
+            assert balances[account.id] == service.get_account_balance(account.id)
@@ -0,0 +1,47 @@
+"""
+Tester för periodiseringar
+"""
+import pytest
+from datetime import date
+from decimal import Decimal
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.models.accrual import AccrualType
+from app.services.accounting import AccountingService
+from app.services.accrual import AccrualService
+
+
+@pytest.fixture
+def accrual(db):
+    """Förutbetald hyra på 1200 kr fördelad över tre månader"""
+    service = AccountingService(db)
+    company = service.create_company(name="Test AB", org_number="556123-4567")
+    service.load_bas_accounts(company.id)
+    fiscal_year = service.create_fiscal_year(company.id, date(2024, 1, 1), date(2024, 12, 31))
+    return AccrualService(db).create_accrual(
+        company_id=company.id,
+        fiscal_year_id=fiscal_year.id,
+        name="Lokalhyra",
+        accrual_type=AccrualType.PREPAID_EXPENSE,
+        total_amount=Decimal("1200.00"),
+        periods=3,
+        start_date=date(2024, 1, 1),
+        source_account_id=service.get_account_by_number(company.id, "1710").id,
+        target_account_id=service.get_account_by_number(company.id, "5010").id,
+    )
+
+
+def test_run_auto_accruals(db, accrual):
+    """Testa att alla perioder bokas med rätt belopp och att periodiseringen avslutas"""
+    entries = AccrualService(db).run_auto_accruals(accrual.company_id, date(2024, 3, 31))
+
+    assert [entry.amount for entry in entries] == [Decimal("400.00")] * 3
+    assert all(entry.is_booked for entry in entries)
+
+    db.refresh(accrual)
+    assert accrual.remaining_amount == 0
+    assert accrual.periods_remaining == 0
+    assert accrual.is_active is False
@@ -0,0 +1,50 @@
+"""
+Tester för uppgradering av äldre databaser
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+
+from app.models.base import Base, upgrade_schema
+
+
+def _columns(connection, table):
+    return {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def test_upgrade_schema_adds_version_id():
+    """Testa att version_id läggs till i en databas från före kolumnen"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for table in ("companies", "annual_reports"):
+            connection.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN version_id")
+        connection.exec_driver_sql(
+            "INSERT INTO companies (name, org_number, accounting_standard, fiscal_year_start_month) "
+            "VALUES ('Gamla AB', '5560000000', 'K2', 1)"
+        )
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)  # Ska gå att köra flera gånger
+
+    with engine.connect() as connection:
+        assert "version_id" in _columns(connection, "companies")
+        assert "version_id" in _columns(connection, "annual_reports")
+        assert connection.exec_driver_sql("SELECT version_id FROM companies").scalar() == 1
+
+
+def test_upgrade_schema_adds_account_index():
+    """Testa att indexet på transaction_lines.account_id skapas i äldre databaser"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_transaction_lines_account_id")
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    with engine.connect() as connection:
+        indexes = {row[1] for row in connection.exec_driver_sql("PRAGMA index_list(transaction_lines)")}
+        assert "ix_transaction_lines_account_id" in indexes
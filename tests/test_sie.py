@@ -10,7 +10,6 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.services.sie_import import SIEParser, SIEImporter
-from app.models.base import Base, engine, SessionLocal
 
 
 # Exempel på SIE4-fil
@@ -27,6 +26,9 @@ SAMPLE_SIE = """
 #KONTO 3010 "Försäljning"
 #KONTO 2410 "Leverantörsskulder"
 #IB 0 1930 50000.00
+#IB 0 2410 -12500.00
+#IB -1 1930 42000.00
+#IB -1 1510 8000.00
 #VER A 1 20240115 "Försäljning kontant"
 {
 #TRANS 1930 {} 1000.00
@@ -40,86 +42,85 @@ SAMPLE_SIE = """
 """
 
 
-@pytest.fixture
-def db():
-    """Skapa en ny databas för varje test"""
-    Base.metadata.create_all(bind=engine)
-    session = SessionLocal()
-    yield session
-    session.close()
-    Base.metadata.drop_all(bind=engine)
+# En parser delas av testerna; parse() börjar alltid med ny SIEData
+PARSER = SIEParser()
 
 
-class TestSIEParser:
-    def test_parse_company_name(self):
-        """Testa parsing av företagsnamn"""
-        parser = SIEParser()
-        data = parser.parse(SAMPLE_SIE)
-        assert data.company_name == "Test AB"
-
-    def test_parse_org_number(self):
-        """Testa parsing av organisationsnummer"""
-        parser = SIEParser()
-        data = parser.parse(SAMPLE_SIE)
-        assert data.org_number == "5561234567"
+@pytest.fixture(scope="module")
+def parsed():
+    """SAMPLE_SIE parsad en gång för alla parsertester"""
+    return PARSER.parse(SAMPLE_SIE)
 
-    def test_parse_fiscal_year(self):
-        """Testa parsing av räkenskapsår"""
-        parser = SIEParser()
-        data = parser.parse(SAMPLE_SIE)
-        assert data.fiscal_year_start == date(2024, 1, 1)
-        assert data.fiscal_year_end == date(2024, 12, 31)
 
-    def test_parse_accounts(self):
+class TestSIEParser:
+    @pytest.mark.parametrize("attr,expected", [
+        ("company_name", "Test AB"),
+        ("org_number", "5561234567"),
+        ("fiscal_year_start", date(2024, 1, 1)),
+        ("fiscal_year_end", date(2024, 12, 31)),
+    ])
+    def test_parse_field(self, parsed, attr, expected):
+        """Testa parsing av företagsnamn, organisationsnummer och räkenskapsår"""
+        assert getattr(parsed, attr) == expected
+
+    def test_parse_accounts(self, parsed):
         """Testa parsing av konton"""
-        parser = SIEParser()
-        data = parser.parse(SAMPLE_SIE)
-        assert len(data.accounts) == 3
+        assert len(parsed.accounts) == 3
 
-        account_numbers = [a.number for a in data.accounts]
+        account_numbers = [a.number for a in parsed.accounts]
         assert "1930" in account_numbers
         assert "3010" in account_numbers
         assert "2410" in account_numbers
 
-    def test_parse_opening_balance(self):
+    @pytest.mark.parametrize("account_number,expected", [
+        ("1930", Decimal("50000.00")),   # Föregående års rad skriver inte över
+        ("2410", Decimal("-12500.00")),  # Negativ ingående balans
+        ("1510", None),                  # Finns bara för föregående år
+    ])
+    def test_parse_opening_balance(self, parsed, account_number, expected):
         """Testa parsing av ingående balans"""
-        parser = SIEParser()
-        data = parser.parse(SAMPLE_SIE)
-        assert "1930" in data.opening_balances
-        assert data.opening_balances["1930"] == Decimal("50000.00")
+        assert parsed.opening_balances.get(account_number) == expected
 
-    def test_parse_transactions(self):
+    def test_parse_transactions(self, parsed):
         """Testa parsing av transaktioner"""
-        parser = SIEParser()
-        data = parser.parse(SAMPLE_SIE)
-        assert len(data.transactions) == 2
+        assert len(parsed.transactions) == 2
 
         # Första transaktionen
-        tx1 = data.transactions[0]
+        tx1 = parsed.transactions[0]
         assert tx1.verification_number == 1
         assert tx1.date == date(2024, 1, 15)
         assert tx1.description == "Försäljning kontant"
         assert len(tx1.lines) == 2
 
+    def test_parse_with_fresh_parser(self, parsed):
+        """Testa att en ny parser ger samma resultat (inget delat tillstånd)"""
+        parser = SIEParser()
+        parser.parse(SAMPLE_SIE)
+        data = parser.parse(SAMPLE_SIE)
+        assert data == parsed
+
+    def test_parse_bytes_input(self, parsed):
+        """Testa att råa PC8-bytes ger samma resultat som text"""
+        data = PARSER.parse(SAMPLE_SIE.encode('cp437'))
+        assert data == parsed
+        assert data.accounts[0].name == "Företagskonto"
+
+
+@pytest.fixture(scope="class")
+def import_stats(db_class):
+    """Statistik från en import av SAMPLE_SIE, delad av importertesterna"""
+    return SIEImporter(db_class).import_file(SAMPLE_SIE)
+
 
 class TestSIEImporter:
-    def test_import_creates_company(self, db):
+    def test_import_creates_company(self, import_stats):
         """Testa att import skapar företag"""
-        importer = SIEImporter(db)
-        stats = importer.import_file(SAMPLE_SIE)
+        assert import_stats['company_created'] is True
 
-        assert stats['company_created'] is True
-
-    def test_import_creates_accounts(self, db):
+    def test_import_creates_accounts(self, import_stats):
         """Testa att import skapar konton"""
-        importer = SIEImporter(db)
-        stats = importer.import_file(SAMPLE_SIE)
-
-        assert stats['accounts_imported'] == 3
+        assert import_stats['accounts_imported'] == 3
 
-    def test_import_creates_transactions(self, db):
+    def test_import_creates_transactions(self, import_stats):
         """Testa att import skapar transaktioner"""
-        importer = SIEImporter(db)
-        stats = importer.import_file(SAMPLE_SIE)
-
-        assert stats['transactions_imported'] == 2
+        assert import_stats['transactions_imported'] == 2